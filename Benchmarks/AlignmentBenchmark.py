@@ -0,0 +1,57 @@
+"""
+Times globalAlignment and localAlignment on random protein pairs in full-matrix and linear-space mode, reporting wall
+time, cells/second and peak traced memory.
+
+Usage: python AlignmentBenchmark.py [length ...]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "Sequence Alignment"),
+                os.path.join(ROOT, "Sequence Alignment", "Global Alignment"),
+                os.path.join(ROOT, "Sequence Alignment", "Local Alignment")]
+
+from GlobalAlignment import globalAlignment
+from LocalAlignment import localAlignment
+from ScoringScheme import ScoringScheme
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def randomSequence(length: int, rng: random.Random) -> str:
+    return ''.join(rng.choice(AMINO_ACIDS) for _ in range(length))
+
+
+def measure(function, *args) -> (float, int):
+    """ Runs function(*args) once; returns wall time in seconds and peak traced memory in bytes. """
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(lengths):
+    rng = random.Random(0)
+    scheme = ScoringScheme.fromDict({(a, b): 5 if a == b else -1 for a in AMINO_ACIDS for b in AMINO_ACIDS})
+    print("function         length   mode      seconds   Mcells/s   peak MB")
+    for length in lengths:
+        s1 = randomSequence(length, rng)
+        s2 = randomSequence(length, rng)
+        cells = (length + 1) ** 2
+        for function in (globalAlignment, localAlignment):
+            for linearSpace in (False, True):
+                elapsed, peak = measure(function, s1, s2, scheme, -5, linearSpace)
+                print("%-16s %-8d %-9s %-9.3f %-10.1f %.1f" % (function.__name__, length,
+                                                               "linear" if linearSpace else "full", elapsed,
+                                                               cells / elapsed / 1e6, peak / 1e6))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [500, 1000, 2000, 4000])
@@ -0,0 +1,239 @@
+"""
+Benchmark suite for the public entry points of all three modules, on seeded synthetic inputs of increasing size:
+random and mutated sequence pairs for the alignments, additive and noisy distance matrices for the tree builders,
+and Gaussian mixtures for the clustering algorithms. Every case records wall time (best of --repeat runs),
+throughput (cells/s or points/s), peak traced memory (one extra run under tracemalloc) and peak RSS; every case
+runs in a fresh process, so the RSS is that case's own peak rather than the suite's so far. The whole run can be
+written to JSON. Given a baseline JSON from an earlier run, cases that got slower
+by more than --threshold are flagged and the exit status is 1.
+
+Usage: python BenchmarkSuite.py [--only name ...] [--sizes quick|full] [--repeat R] [--output results.json]
+                                [--baseline baseline.json] [--threshold 0.25]
+"""
+import argparse
+import multiprocessing
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "Sequence Alignment"),
+                os.path.join(ROOT, "Sequence Alignment", "Global Alignment"),
+                os.path.join(ROOT, "Sequence Alignment", "Local Alignment"),
+                os.path.join(ROOT, "Sequence Alignment", "Edit Distance"),
+                os.path.join(ROOT, "Phylogeny"),
+                os.path.join(ROOT, "Phylogeny", "Neighbor Joining"),
+                os.path.join(ROOT, "Phylogeny", "Additive Phylogeny"),
+                os.path.join(ROOT, "Clustering Algorithms"),
+                os.path.join(ROOT, "Clustering Algorithms", "Lloyd's Algorithm"),
+                os.path.join(ROOT, "Clustering Algorithms", "Soft K-Means")]
+
+from GlobalAlignment import globalAlignment
+from LocalAlignment import localAlignment
+from EditDistance import editDistance
+from ScoringScheme import ScoringScheme
+from NeighborJoining import neighborJoining
+from AdditivePhylogeny import additivePhylogeny
+from lloydAlgorithm import LloydAlgorithm
+from softKMeans import softCluster
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+# Soft k-means steps per benchmark run
+SOFT_STEPS = 10
+
+
+def randomSequence(length: int, rng: random.Random) -> str:
+    return ''.join(rng.choice(AMINO_ACIDS) for _ in range(length))
+
+
+def mutatedSequence(sequence: str, rate: float, rng: random.Random) -> str:
+    """ Copy of sequence where every position is substituted, deleted or followed by an insertion with total
+        probability rate. """
+    result = []
+    for c in sequence:
+        roll = rng.random()
+        if roll < rate / 3:
+            result.append(rng.choice(AMINO_ACIDS))
+        elif roll < 2 * rate / 3:
+            continue
+        elif roll < rate:
+            result.append(c + rng.choice(AMINO_ACIDS))
+        else:
+            result.append(c)
+    return ''.join(result)
+
+
+def additiveMatrix(n: int, rng: np.random.Generator) -> np.ndarray:
+    """ Leaf distances of a random binary tree with integer edge lengths 1-10, built by joining random pairs of
+        subtrees. """
+    D = np.zeros((n, n), dtype=np.int64)
+    subtrees = [(np.array([i]), np.zeros(1, dtype=np.int64)) for i in range(n)]
+    while len(subtrees) > 1:
+        a, b = sorted(rng.choice(len(subtrees), 2, replace=False), reverse=True)
+        (leavesA, depthA), (leavesB, depthB) = subtrees.pop(a), subtrees.pop(b)
+        edgeA, edgeB = rng.integers(1, 11, 2)
+        D[np.ix_(leavesA, leavesB)] = depthA[:, None] + edgeA + edgeB + depthB[None, :]
+        D[np.ix_(leavesB, leavesA)] = D[np.ix_(leavesA, leavesB)].T
+        subtrees.append((np.concatenate([leavesA, leavesB]), np.concatenate([depthA + edgeA, depthB + edgeB])))
+    return D
+
+
+def noisyMatrix(n: int, rng: np.random.Generator, noise: float = 0.1) -> np.ndarray:
+    """ additiveMatrix with symmetric multiplicative noise of up to +-noise, so it is no longer additive. """
+    D = additiveMatrix(n, rng) * (1 + noise * rng.uniform(-1, 1, (n, n)))
+    D = np.triu(D, 1)
+    return D + D.T
+
+
+def gaussianMixture(n: int, m: int, k: int, rng: np.random.Generator) -> np.ndarray:
+    """ n points in m dimensions around k random means with unit variance. """
+    means = rng.uniform(-10, 10, (k, m))
+    return means[rng.integers(0, k, n)] + rng.normal(size=(n, m))
+
+
+def alignmentCase(function, mutated: bool):
+    scheme = ScoringScheme.fromDict({(a, b): 5 if a == b else -1 for a in AMINO_ACIDS for b in AMINO_ACIDS})
+
+    def setup(size, seed):
+        rng = random.Random(seed)
+        s1 = randomSequence(size, rng)
+        s2 = mutatedSequence(s1, 0.1, rng) if mutated else randomSequence(size, rng)
+        return (lambda: function(s1, s2, scheme, -5)), (len(s1) + 1) * (len(s2) + 1)
+    return setup
+
+
+def editDistanceCase(size, seed):
+    rng = random.Random(seed)
+    s1 = randomSequence(size, rng)
+    s2 = mutatedSequence(s1, 0.1, rng)
+    return (lambda: editDistance(s1, s2)), (len(s1) + 1) * (len(s2) + 1)
+
+
+def neighborJoiningCase(size, seed):
+    D = noisyMatrix(size, np.random.default_rng(seed))
+    return (lambda: neighborJoining(D, size)), size * size
+
+
+def additivePhylogenyCase(size, seed):
+    D = additiveMatrix(size, np.random.default_rng(seed))
+    return (lambda: additivePhylogeny(D, size, size)), size * size
+
+
+def lloydCase(size, seed, m=8, k=16):
+    points = gaussianMixture(size, m, k, np.random.default_rng(seed))
+    return (lambda: LloydAlgorithm(points[:k], points)), size
+
+
+def softCase(size, seed, m=8, k=8):
+    points = gaussianMixture(size, m, k, np.random.default_rng(seed))
+    return (lambda: softCluster(1.0, points[:k], points, SOFT_STEPS)), size
+
+
+# name: (setup(size, seed) -> (run, work units), unit, quick sizes, full sizes)
+CASES = {
+    'globalAlignment': (alignmentCase(globalAlignment, True), 'cells', [500, 1000], [500, 1000, 2000, 4000]),
+    'localAlignment': (alignmentCase(localAlignment, False), 'cells', [500, 1000], [500, 1000, 2000, 4000]),
+    'editDistance': (editDistanceCase, 'cells', [1000, 5000], [1000, 5000, 20000, 50000]),
+    'neighborJoining': (neighborJoiningCase, 'cells', [100, 250], [100, 250, 500, 1000]),
+    'additivePhylogeny': (additivePhylogenyCase, 'cells', [100, 250], [100, 250, 500, 1000]),
+    'LloydAlgorithm': (lloydCase, 'points', [10000, 50000], [10000, 100000, 500000]),
+    'softCluster': (softCase, 'points', [10000, 50000], [10000, 100000, 500000]),
+}
+
+
+def measure(run, repeat: int) -> (float, int, int):
+    """
+    Best wall time of repeat runs, then one more run under tracemalloc.
+    Return: seconds, peak traced bytes, peak resident set size of the process so far in bytes (per case only when
+        the process runs nothing else, see measureCase)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return best, peak, maxRss
+
+
+def measureCase(name: str, size: int, seed: int, repeat: int) -> (float, int, int, int):
+    """
+    Sets up and measures one case; meant to run alone in a fresh worker process so its peak RSS covers this case
+    only (the interpreter, the imports and the case's inputs included).
+    Return: seconds, peak traced bytes, peak resident set size in bytes, work units
+    """
+    run, work = CASES[name][0](size, seed)
+    return measure(run, repeat) + (work,)
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """ Cases whose time grew by more than threshold (a fraction) over the baseline entry with the same name and
+        size. """
+    previous = {(entry['function'], entry['size']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry['function'], entry['size']))
+        if old is not None and entry['seconds'] > old['seconds'] * (1 + threshold):
+            regressions.append((entry, old))
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the alignment, phylogeny and clustering entry points.")
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--sizes', choices=('quick', 'full'), default='full')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = []
+    print("function           size      seconds   M%-9s peak MB   max RSS MB" % "units/s")
+    for name in args.only:
+        _, unit, quickSizes, fullSizes = CASES[name]
+        for size in (quickSizes if args.sizes == 'quick' else fullSizes):
+            # A spawned process starts without the memory of the cases before it
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                seconds, peak, maxRss, work = pool.submit(measureCase, name, size, args.seed, args.repeat).result()
+            results.append({'function': name, 'size': size, 'seconds': seconds, 'unit': unit,
+                            'rate': work / seconds, 'peakTracedMB': peak / 1e6, 'maxRssMB': maxRss / 1e6})
+            print("%-18s %-9d %-9.3f %-10.2f %-9.1f %.1f" % (name, size, seconds, work / seconds / 1e6, peak / 1e6,
+                                                            maxRss / 1e6))
+
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+              'cpus': os.cpu_count(), 'seed': args.seed, 'repeat': args.repeat, 'results': results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for entry, old in regressions:
+            print("Regression: %s size %d took %.3f s, baseline %.3f s (%+.0f%%)" % (
+                entry['function'], entry['size'], entry['seconds'], old['seconds'],
+                100 * (entry['seconds'] / old['seconds'] - 1)))
+        if regressions:
+            return 1
+        print("No regressions over " + args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
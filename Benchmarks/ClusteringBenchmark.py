@@ -0,0 +1,54 @@
+"""
+Scaling benchmark for the sharded clustering engines: runs LloydAlgorithm and softCluster on one Gaussian mixture
+with 1, 2, 4, ... worker processes up to the number of cores and reports speedup over one worker. Every run is
+checked against the single-worker result, which must match exactly since the shards do not depend on the workers.
+
+Usage: python ClusteringBenchmark.py [points] [dimensions] [clusters]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Clustering Algorithms"))
+sys.path.insert(0, os.path.join(ROOT, "Clustering Algorithms", "Lloyd's Algorithm"))
+sys.path.insert(0, os.path.join(ROOT, "Clustering Algorithms", "Soft K-Means"))
+
+from lloydAlgorithm import LloydAlgorithm
+from softKMeans import softCluster
+
+
+def main(n: int, m: int, k: int):
+    rng = np.random.default_rng(0)
+    means = rng.uniform(-10, 10, (k, m))
+    points = means[rng.integers(0, k, n)] + rng.normal(size=(n, m))
+    centroids = points[:k].copy()
+
+    workerCounts = [1]
+    while workerCounts[-1] * 2 <= os.cpu_count():
+        workerCounts.append(workerCounts[-1] * 2)
+    if workerCounts[-1] != os.cpu_count():
+        workerCounts.append(os.cpu_count())
+
+    engines = [("lloyd", lambda workers: LloydAlgorithm(centroids, points, workers=workers)),
+               ("soft", lambda workers: softCluster(1.0, centroids, points, 10, workers=workers))]
+    for name, run in engines:
+        print(name)
+        print("workers  seconds   Mpoints/s  speedup")
+        serial = None
+        for workers in workerCounts:
+            start = time.perf_counter()
+            result = run(workers)
+            elapsed = time.perf_counter() - start
+            if serial is None:
+                serial = (result, elapsed)
+            elif not np.array_equal(result, serial[0]):
+                print("Error: result with " + str(workers) + " workers differs from the serial result")
+            print("%-8d %-9.3f %-10.2f %.2f" % (workers, elapsed, n / elapsed / 1e6, serial[1] / elapsed))
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 1000000, args[1] if len(args) > 1 else 8, args[2] if len(args) > 2 else 32)
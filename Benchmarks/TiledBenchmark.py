@@ -0,0 +1,48 @@
+"""
+Scaling benchmark for tiledScore: times one large fitting alignment with 1, 2, 4, ... worker processes up to the
+number of cores and reports speedup over one worker. Every run is checked against the single-worker result.
+
+Usage: python TiledBenchmark.py [length of s1] [length of s2]
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Sequence Alignment"))
+
+from ScoringScheme import ScoringScheme
+from TiledAlignment import tiledScore
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def main(n: int, m: int):
+    rng = random.Random(0)
+    s1 = ''.join(rng.choice(AMINO_ACIDS) for _ in range(n))
+    s2 = ''.join(rng.choice(AMINO_ACIDS) for _ in range(m))
+    scheme = ScoringScheme.fromDict({(a, b): 5 if a == b else -1 for a in AMINO_ACIDS for b in AMINO_ACIDS})
+
+    workerCounts = [1]
+    while workerCounts[-1] * 2 <= os.cpu_count():
+        workerCounts.append(workerCounts[-1] * 2)
+    if workerCounts[-1] != os.cpu_count():
+        workerCounts.append(os.cpu_count())
+
+    print("workers  seconds   Mcells/s   speedup")
+    serial = None
+    for workers in workerCounts:
+        start = time.perf_counter()
+        result = tiledScore(s1, s2, scheme, -5, 'fitting', workers=workers)
+        elapsed = time.perf_counter() - start
+        if serial is None:
+            serial = (result, elapsed)
+        elif result != serial[0]:
+            print("Error: result with " + str(workers) + " workers differs from the serial result")
+        print("%-8d %-9.3f %-10.1f %.2f" % (workers, elapsed, (n + 1) * (m + 1) / elapsed / 1e6, serial[1] / elapsed))
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 20000, args[1] if len(args) > 1 else 10000)
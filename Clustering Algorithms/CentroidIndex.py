@@ -0,0 +1,176 @@
+import numpy as np
+
+# The index pays off for many centers in few dimensions; otherwise assignment brute-forces all distances
+MAX_INDEX_DIMENSION = 16
+MIN_INDEX_CENTROIDS = 256
+
+# Points sent through the index at once
+INDEX_BATCH = 1 << 15
+
+
+class CentroidIndex:
+    """
+    KD-tree over a set of centers for batched nearest-center queries. Every node stores the bounding box of its
+    centers and splits them at the median of its widest dimension; leaves hold up to leafSize centers, sorted by
+    index. Building takes O(k log k) and is cheap enough to redo every iteration of Lloyd's algorithm.
+
+    A query walks the tree breadth-first for a whole batch of points at once: each point starts with the centers in
+    the leaf that contains it, then (point, node) pairs are expanded level by level, dropping every pair whose box
+    is farther than the point's current count-th nearest center. Leaves that survive are scanned with one
+    squaredDistances call per leaf for all the points that reached them.
+    """
+    __slots__ = ('centroids', 'centroidNorms', 'leafSize', 'order', 'lo', 'hi', 'left', 'right',
+                 'splitDim', 'splitValue', 'start', 'stop')
+
+    def __init__(self, centroids: np.ndarray, leafSize: int = 64):
+        """
+        :param centroids: k x m numpy array of centers
+        :param leafSize: largest number of centers in a leaf
+        """
+        self.centroids = np.asarray(centroids, dtype=float)
+        self.centroidNorms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.leafSize = max(1, leafSize)
+        k, m = self.centroids.shape
+        order = np.arange(k)
+        lo, hi, left, right, splitDim, splitValue, start, stop = [], [], [], [], [], [], [], []
+        pending = [(0, k)]
+        for begin, end in pending:
+            members = self.centroids[order[begin:end]]
+            lo.append(members.min(axis=0) if end > begin else np.zeros(m))
+            hi.append(members.max(axis=0) if end > begin else np.zeros(m))
+            start.append(begin)
+            stop.append(end)
+            spread = hi[-1] - lo[-1]
+            if end - begin <= self.leafSize or spread.max(initial=0) == 0:
+                order[begin:end].sort()
+                left.append(-1)
+                right.append(-1)
+                splitDim.append(0)
+                splitValue.append(0.0)
+                continue
+            dim = int(np.argmax(spread))
+            half = (end - begin) // 2
+            split = np.argpartition(members[:, dim], half)
+            order[begin:end] = order[begin:end][split]
+            splitDim.append(dim)
+            splitValue.append(self.centroids[order[begin + half], dim])
+            left.append(len(pending))
+            right.append(len(pending) + 1)
+            pending.append((begin, begin + half))
+            pending.append((begin + half, end))
+
+        self.order = order
+        self.lo = np.array(lo)
+        self.hi = np.array(hi)
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.splitDim = np.array(splitDim, dtype=np.intp)
+        self.splitValue = np.array(splitValue)
+        self.start = np.array(start, dtype=np.intp)
+        self.stop = np.array(stop, dtype=np.intp)
+
+    def query(self, points: np.ndarray, count: int = 1, pointNorms: np.ndarray = None) -> (np.ndarray, np.ndarray):
+        """
+        the count nearest centers of every point
+        :param points: numpy array of points
+        :param count: number of nearest centers per point
+        :param pointNorms: squared norms of the points, if already known
+        :return: len(points) x count numpy arrays of squared distances (as computed by squaredDistances) and center
+            indices, nearest first; ties go to the lower index. Distances are computed leaf by leaf, so they can differ
+            from a single squaredDistances call over all centers by rounding, and so can the choice between centers
+            that are equally near up to rounding.
+        """
+        points = np.asarray(points, dtype=float)
+        if pointNorms is None:
+            pointNorms = np.einsum('ij,ij->i', points, points)
+        count = min(count, len(self.centroids))
+        bestDist = np.full((len(points), count), np.inf)
+        bestIndex = np.full((len(points), count), len(self.centroids), dtype=np.intp)
+        for begin in range(0, len(points), INDEX_BATCH):
+            rows = slice(begin, begin + INDEX_BATCH)
+            self.queryBatch(points[rows], pointNorms[rows], bestDist[rows], bestIndex[rows])
+        return bestDist, bestIndex
+
+    def queryBatch(self, points, pointNorms, bestDist, bestIndex):
+        n = len(points)
+        # Rounding error of the expanded squared distances, so no pair is pruned by an underestimate
+        gamma = 2 * (points.shape[1] + 2) * np.finfo(float).eps
+        slack = gamma * 2 * (pointNorms + self.centroidNorms.max(initial=0))
+
+        # Seed every point with the leaf it falls into
+        home = np.zeros(n, dtype=np.intp)
+        inner = np.flatnonzero(self.left[home] >= 0)
+        while len(inner) > 0:
+            node = home[inner]
+            right = points[inner, self.splitDim[node]] >= self.splitValue[node]
+            home[inner] = np.where(right, self.right[node], self.left[node])
+            inner = inner[self.left[home[inner]] >= 0]
+        self.scanLeaves(points, pointNorms, np.arange(n), home, bestDist, bestIndex)
+
+        pairPoint = np.arange(n)
+        pairNode = np.zeros(n, dtype=np.intp)
+        while len(pairPoint) > 0:
+            x = points[pairPoint]
+            gap = np.maximum(self.lo[pairNode] - x, 0) + np.maximum(x - self.hi[pairNode], 0)
+            gap = np.einsum('ij,ij->i', gap, gap)
+            keep = gap - slack[pairPoint] <= bestDist[pairPoint, -1]
+            pairPoint, pairNode = pairPoint[keep], pairNode[keep]
+
+            leaf = self.left[pairNode] < 0
+            scan = leaf & (pairNode != home[pairPoint])
+            self.scanLeaves(points, pointNorms, pairPoint[scan], pairNode[scan], bestDist, bestIndex)
+            pairPoint, pairNode = pairPoint[~leaf], pairNode[~leaf]
+            pairPoint = np.concatenate([pairPoint, pairPoint])
+            pairNode = np.concatenate([self.left[pairNode], self.right[pairNode]])
+
+    def scanLeaves(self, points, pointNorms, pairPoint, pairNode, bestDist, bestIndex):
+        """ merge the centers of every (point, leaf) pair into the points' nearest lists, one leaf at a time """
+        grouped = np.argsort(pairNode, kind='stable')
+        leaves, firsts = np.unique(pairNode[grouped], return_index=True)
+        bounds = np.append(firsts, len(grouped))
+        for leaf, first, last in zip(leaves.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+            rows = pairPoint[grouped[first:last]]
+            ids = self.order[self.start[leaf]:self.stop[leaf]]
+            dist = squaredDistances(points[rows], self.centroids[ids], pointNorms[rows], self.centroidNorms[ids])
+            if bestDist.shape[1] == 1:
+                nearest = np.argmin(dist, axis=1)
+                nearestDist = dist[np.arange(len(rows)), nearest]
+                nearestIndex = ids[nearest]
+                better = (nearestDist < bestDist[rows, 0]) | \
+                         ((nearestDist == bestDist[rows, 0]) & (nearestIndex < bestIndex[rows, 0]))
+                bestDist[rows[better], 0] = nearestDist[better]
+                bestIndex[rows[better], 0] = nearestIndex[better]
+            else:
+                allDist = np.concatenate([bestDist[rows], dist], axis=1)
+                allIndex = np.concatenate([bestIndex[rows], np.broadcast_to(ids, dist.shape)], axis=1)
+                keep = np.lexsort((allIndex, allDist), axis=1)[:, :bestDist.shape[1]]
+                bestDist[rows] = np.take_along_axis(allDist, keep, axis=1)
+                bestIndex[rows] = np.take_along_axis(allIndex, keep, axis=1)
+
+
+def useIndex(k: int, m: int) -> bool:
+    """
+    whether a CentroidIndex beats brute force for k centers in m dimensions: pruning needs far more centers than
+    the 2^m orthants around a point, and brute force runs at matrix product speed
+    """
+    return m <= MAX_INDEX_DIMENSION and k >= max(MIN_INDEX_CENTROIDS, 2 ** (m + 5))
+
+
+def squaredDistances(points, centroids, pointNorms=None, centroidNorms=None):
+    """
+    squared euclidean distance between every point and every centroid, as ||x||^2 - 2 x.c + ||c||^2
+    :param points: numpy array of points
+    :param centroids: numpy array of centroids
+    :param pointNorms: squared norms of the points, if already known
+    :param centroidNorms: squared norms of the centroids, if already known
+    :return: len(points) x len(centroids) numpy array, clipped at 0 against rounding
+    """
+    if pointNorms is None:
+        pointNorms = np.einsum('ij,ij->i', points, points)
+    if centroidNorms is None:
+        centroidNorms = np.einsum('ij,ij->i', centroids, centroids)
+    dist = points @ centroids.T
+    dist *= -2
+    dist += pointNorms[:, None]
+    dist += centroidNorms[None, :]
+    return np.maximum(dist, 0, out=dist)
@@ -0,0 +1,192 @@
+import math
+import os
+import sys
+import numpy as np
+
+# The shared helpers live in the parent folder, Lloyd's algorithm and soft k-means in sibling folders
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in (ROOT, os.path.join(ROOT, "Lloyd's Algorithm"), os.path.join(ROOT, "Soft K-Means")):
+    if folder not in sys.path:
+        sys.path.append(folder)
+from CentroidIndex import squaredDistances
+from ParallelShards import SharedPool, workerArrays
+from lloydAlgorithm import LloydAlgorithm
+from softKMeans import softCluster
+
+# Distance chunks hold about this many point-to-center distances
+CHUNK_ENTRIES = 1 << 22
+
+
+def kMeansPlusPlus(points: np.ndarray, k: int, rng=None, trials: int = None, weights: np.ndarray = None):
+    """
+    k-means++ seeding (Arthur and Vassilvitskii, 2007): the first center is a random point, and every further center
+    is a point drawn with probability proportional to its squared distance D(x)^2 to the nearest center chosen so
+    far. Greedy variant: each step draws several candidates at once and keeps the one that lowers the total D(x)^2
+    the most; the candidates are scored together, in chunks of points.
+
+    :param points: numpy array of data points
+    :param k: number of centers
+    :param rng: numpy random generator or seed
+    :param trials: candidates per step (default: 2 + log k)
+    :param weights: weight of every point (default: all 1), e.g. the cluster sizes behind the candidates of k-means||
+    :return: k x m numpy array of centers, all of them data points
+    """
+    rng = np.random.default_rng(rng)
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+    trials = trials or 2 + int(math.log(max(k, 1)))
+    pointNorms = np.einsum('ij,ij->i', points, points)
+
+    chosen = [int(rng.choice(n, p=weights / weights.sum()))]
+    closest = squaredDistances(points, points[chosen], pointNorms)[:, 0]
+    for c in range(1, k):
+        potential = weights * closest
+        total = potential.sum()
+        if total <= 0:
+            # Every point sits on a center: the rest can only repeat points
+            candidates = rng.choice(n, trials)
+        else:
+            candidates = np.searchsorted(np.cumsum(potential), rng.random(trials) * total, side='right')
+            candidates = np.minimum(candidates, n - 1)
+        best = int(candidates[np.argmin(candidateScores(points, candidates, closest, weights, pointNorms))])
+        chosen.append(best)
+        closest = np.minimum(closest, squaredDistances(points, points[[best]], pointNorms)[:, 0])
+    return points[chosen].copy()
+
+
+def kMeansParallel(points: np.ndarray, k: int, rng=None, rounds: int = 5, oversampling: float = None):
+    """
+    k-means|| seeding (Bahmani et al., 2012) for very large n: a few rounds each keep every point independently with
+    probability oversampling * D(x)^2 / (total D(x)^2), which gives a candidate set of about
+    rounds * oversampling points in a handful of passes over the data. Every candidate is weighted by the number of
+    points nearest to it, and weighted k-means++ picks the k centers among the candidates.
+
+    :param points: numpy array of data points
+    :param k: number of centers
+    :param rng: numpy random generator or seed
+    :param rounds: number of sampling rounds
+    :param oversampling: expected candidates per round (default: 2k)
+    :return: k x m numpy array of centers, all of them data points
+    """
+    if k > len(points):
+        print("Error: k-means|| needs at least k = " + str(k) + " points, not " + str(len(points)) + ".")
+        return None
+    rng = np.random.default_rng(rng)
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    oversampling = oversampling or 2 * k
+    pointNorms = np.einsum('ij,ij->i', points, points)
+
+    chosen = np.array([rng.integers(n)])
+    closest, _ = nearestCenters(points, points[chosen], pointNorms)
+    for r in range(rounds):
+        total = closest.sum()
+        if total <= 0:
+            break
+        picked = np.flatnonzero(rng.random(n) < oversampling * closest / total)
+        if len(picked) == 0:
+            continue
+        chosen = np.concatenate([chosen, picked])
+        closest = np.minimum(closest, nearestCenters(points, points[picked], pointNorms)[0])
+
+    candidates = points[chosen]
+    if len(candidates) <= k:
+        # Fill up with points that are not candidates yet
+        extra = rng.choice(np.setdiff1d(np.arange(n), chosen), k - len(candidates), replace=False)
+        return np.concatenate([candidates, points[extra]])
+    labels = nearestCenters(points, candidates, pointNorms)[1]
+    return kMeansPlusPlus(candidates, k, rng, weights=np.bincount(labels, minlength=len(candidates)))
+
+
+def kMeansRestarts(points: np.ndarray, k: int, restarts: int = 10, workers: int = None, seed: int = 0,
+                   seeding: str = 'kmeans++', B: float = None, n: int = 100):
+    """
+    Runs Lloyd's algorithm (or soft k-means) from several seedings on a process pool that reads the points from
+    shared memory, and keeps the result with the lowest inertia. Restart r seeds from the generator
+    default_rng([seed, r]), so the result is reproducible from seed and does not depend on workers; among restarts
+    with equal inertia the first one wins.
+
+    :param points: numpy array of data points
+    :param k: number of centers
+    :param restarts: number of seedings to run
+    :param workers: number of processes (default: all cores; 1 runs in this process)
+    :param seed: random seed
+    :param seeding: 'kmeans++' or 'kmeans||'
+    :param B: stiffness; if given, each restart runs softCluster(B, ...) instead of LloydAlgorithm
+    :param n: maximum number of soft k-means steps
+    :return: best centers, their inertia (sum of squared distances from the points to their nearest center)
+    """
+    if seeding not in ('kmeans++', 'kmeans||'):
+        print("Error: unknown seeding " + str(seeding) + ".")
+        return None, math.inf
+    if restarts < 1:
+        print("Error: restarts must be at least 1, not " + str(restarts) + ".")
+        return None, math.inf
+    if seeding == 'kmeans||' and k > len(points):
+        print("Error: k-means|| needs at least k = " + str(k) + " points, not " + str(len(points)) + ".")
+        return None, math.inf
+    points = np.asarray(points, dtype=float)
+    settings = (k, seed, seeding, B, n)
+    with SharedPool({'points': points}, workers) as pool:
+        results = pool.map(restartTask, [(r, settings) for r in range(restarts)])
+
+    best = min(range(restarts), key=lambda r: results[r][1])
+    return results[best]
+
+
+def candidateScores(points, candidates, closest, weights, pointNorms):
+    """
+    total weighted D(x)^2 if each candidate were added to the centers, in chunks of points
+    :param closest: squared distance from every point to its nearest center so far
+    :return: numpy array of one total per candidate
+    """
+    chunkSize = max(1, CHUNK_ENTRIES // max(len(candidates), 1))
+    totals = np.zeros(len(candidates))
+    for start in range(0, len(points), chunkSize):
+        stop = min(start + chunkSize, len(points))
+        dist = squaredDistances(points[start:stop], points[candidates], pointNorms[start:stop])
+        np.minimum(dist, closest[start:stop, None], out=dist)
+        totals += weights[start:stop] @ dist
+    return totals
+
+
+def restartTask(task):
+    """
+    one seeded restart over the shared points
+    :param task: (restart number, (k, seed, seeding, B, n))
+    :return: centers, inertia
+    """
+    r, (k, seed, seeding, B, n) = task
+    points = workerArrays['points']
+    rng = np.random.default_rng([seed, r])
+    centroids = kMeansPlusPlus(points, k, rng) if seeding == 'kmeans++' else kMeansParallel(points, k, rng)
+    if B is None:
+        centroids = LloydAlgorithm(centroids, points)
+    else:
+        centroids = softCluster(B, centroids, points, n)
+    return centroids, inertia(centroids, points)
+
+
+def inertia(centroids: np.ndarray, points: np.ndarray) -> float:
+    """ sum of squared distances from the points to their nearest center """
+    return float(nearestCenters(np.asarray(points, dtype=float), np.asarray(centroids, dtype=float))[0].sum())
+
+
+def nearestCenters(points, centers, pointNorms=None):
+    """
+    squared distance to, and index of, every point's nearest center, in chunks of points
+    :return: numpy array of squared distances, numpy array of center indices
+    """
+    if pointNorms is None:
+        pointNorms = np.einsum('ij,ij->i', points, points)
+    centerNorms = np.einsum('ij,ij->i', centers, centers)
+    chunkSize = max(1, CHUNK_ENTRIES // max(len(centers), 1))
+    closest = np.empty(len(points))
+    labels = np.empty(len(points), dtype=np.intp)
+    for start in range(0, len(points), chunkSize):
+        stop = min(start + chunkSize, len(points))
+        dist = squaredDistances(points[start:stop], centers, pointNorms[start:stop], centerNorms)
+        labels[start:stop] = np.argmin(dist, axis=1)
+        closest[start:stop] = dist[np.arange(stop - start), labels[start:stop]]
+    return closest, labels
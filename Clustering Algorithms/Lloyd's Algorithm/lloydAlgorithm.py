@@ -1,9 +1,21 @@
-import numpy as np
+import os
 import sys
+import numpy as np
 import math
 
+# The centroid index and shard helpers live in the parent folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from CentroidIndex import CentroidIndex, squaredDistances, useIndex
+from ParallelShards import SharedPool, shardRanges, workerArrays
+
+# Assignment chunks hold about this many point-to-centroid distances
+CHUNK_ENTRIES = 1 << 22
 
-def LloydAlgorithm(centroids: np.ndarray, points: np.ndarray):
+
+def LloydAlgorithm(centroids: np.ndarray, points: np.ndarray, chunkSize: int = None, accelerate: str = None,
+                   index: str = 'auto', workers: int = None, shardSize: int = None):
     """
     Lloyd's algorithm is a popular clustering heuristic for k-Means clustering problem.
     It first chooses k arbitrary points Centers from Data as centers and then iteratively performs the following
@@ -14,63 +26,342 @@ def LloydAlgorithm(centroids: np.ndarray, points: np.ndarray):
         2) Clusters to Centers: After data points have been assigned to clusters, assign each cluster’s center of
         gravity to be the cluster’s new center.
 
+    Both steps are vectorized: assignment works on chunks of points at a time, so memory stays bounded by
+    chunkSize x k distances, and centers are updated with per-cluster bincount sums. A cluster that loses all of its
+    points keeps its previous center. For many centers in few dimensions, assignment instead queries a KD-tree over
+    the centers (CentroidIndex), rebuilt every iteration.
+
     :param centroids: initial centers
     :param points: numpy array of data points
+    :param chunkSize: number of points assigned at once (default: about 4M distances per chunk)
+    :param accelerate: 'hamerly' or 'elkan' to skip distances with triangle-inequality bounds (see acceleratedLloyd);
+        runs in this process with brute-force distances, so it raises ValueError together with workers, shardSize or
+        index='kdtree'
+    :param index: 'auto', 'kdtree' or 'brute' (see clusterPoints)
+    :param workers: run on this many processes (see shardedLloyd); default: this process only
+    :param shardSize: points per shard when running on workers
     :return: set of centers consisting of k points
     """
+    if accelerate is not None:
+        if workers is not None or shardSize is not None or index == 'kdtree':
+            raise ValueError("accelerate=" + repr(accelerate) + " runs in one process without a KD-tree; it cannot be "
+                             "combined with workers, shardSize or index='kdtree'")
+        return acceleratedLloyd(centroids, points, accelerate, chunkSize)[0]
+    if workers is not None:
+        return shardedLloyd(centroids, points, workers, shardSize, chunkSize, index)
+
     # store number of centers and dimension
+    centroids = np.asarray(centroids, dtype=float)
+    points = np.asarray(points, dtype=float)
     k, m = centroids.shape
+    pointNorms = np.einsum('ij,ij->i', points, points)
 
-    labels = clusterPoints(centroids, points)
-    newCentroids = updateCentroids(points, labels, k, m)
+    labels = clusterPoints(centroids, points, chunkSize, pointNorms, index)
+    newCentroids = updateCentroids(points, labels, k, m, centroids)
     while not np.allclose(centroids, newCentroids, atol=1e-03):
         centroids = newCentroids
-        labels = clusterPoints(centroids, points)
-        newCentroids = updateCentroids(points, labels, k, m)
+        labels = clusterPoints(centroids, points, chunkSize, pointNorms, index)
+        newCentroids = updateCentroids(points, labels, k, m, centroids)
+    return centroids
+
+
+def shardedLloyd(centroids: np.ndarray, points: np.ndarray, workers: int = None, shardSize: int = None,
+                 chunkSize: int = None, index: str = 'auto'):
+    """
+    Lloyd's algorithm on a process pool. The points are copied into shared memory once and split into fixed shards;
+    every iteration each shard assigns its points and returns its per-cluster sums and counts, and the partials are
+    added up in shard order. The centers therefore depend on the shard size but not on the number of workers.
+
+    :param centroids: initial centers
+    :param points: numpy array of data points
+    :param workers: number of processes (default: all cores; 1 runs in this process)
+    :param shardSize: points per shard (default: ParallelShards.SHARD_POINTS)
+    :param chunkSize: number of points a shard assigns at once
+    :param index: 'auto', 'kdtree' or 'brute' (see clusterPoints); the index is built once per iteration and shipped
+        to every shard
+    :return: set of centers consisting of k points
+    """
+    centroids = np.asarray(centroids, dtype=float)
+    points = np.asarray(points, dtype=float)
+    shards = shardRanges(len(points), shardSize)
+    arrays = {'points': points, 'pointNorms': np.einsum('ij,ij->i', points, points)}
+    with SharedPool(arrays, workers) as pool:
+        def update(centroids):
+            shardIndex = resolveIndex(centroids, index)
+            partials = pool.map(lloydShard, [(start, stop, centroids, chunkSize, shardIndex) for start, stop in shards])
+            return reduceCentroids(partials, centroids)
+
+        newCentroids = update(centroids)
+        while not np.allclose(centroids, newCentroids, atol=1e-03):
+            centroids = newCentroids
+            newCentroids = update(centroids)
+    return centroids
+
+
+def lloydShard(task):
+    """
+    assign one shard of the shared points
+    :param task: (start, stop, centroids, chunkSize, index) of the shard
+    :return: per-cluster sums of the shard's points and their counts
+    """
+    start, stop, centroids, chunkSize, index = task
+    points = workerArrays['points'][start:stop]
+    labels = clusterPoints(centroids, points, chunkSize, workerArrays['pointNorms'][start:stop], index)
+    return clusterSums(points, labels, *centroids.shape)
+
+
+def reduceCentroids(partials, previous):
+    """
+    new centers from per-shard (sums, counts), added up in shard order; a cluster without points keeps its previous
+    center
+    """
+    sums = np.zeros(previous.shape)
+    counts = np.zeros(len(previous), dtype=np.int64)
+    for partialSums, partialCounts in partials:
+        sums += partialSums
+        counts += partialCounts
+    centroids = np.array(previous, dtype=float)
+    filled = counts > 0
+    centroids[filled] = sums[filled] / counts[filled, None]
     return centroids
 
 
-def clusterPoints(centroids, points):
+def acceleratedLloyd(centroids: np.ndarray, points: np.ndarray, method: str = 'hamerly', chunkSize: int = None):
+    """
+    Lloyd's algorithm with distance bounds, for the later iterations in which few points change cluster.
+    Every point keeps an upper bound on the distance to its own center and a lower bound on the distance to
+    the other centers: one bound for all of them ('hamerly', O(n) memory) or one per center ('elkan', O(n*k)
+    memory, fewer distance evaluations). After the centers move, the bounds grow by the distance moved. Half the
+    distance from a center to its nearest other center is a second lower bound. A point whose bounds prove its
+    center cannot change is skipped; for the rest only the distances the bounds cannot rule out are computed.
+
+    The bounds carry a margin for the rounding error of the ||x||^2 - 2 x.c + ||c||^2 distances of clusterPoints.
+    Points where another center comes within that margin are reassigned with the same formula. So every
+    iteration gives the same labels, and the run gives the same centers, as LloydAlgorithm with index='brute'.
+
+    :param centroids: initial centers
+    :param points: numpy array of data points
+    :param method: 'hamerly' or 'elkan'
+    :param chunkSize: number of points assigned at once (default: about 4M distances per chunk)
+    :return: set of centers consisting of k points, and one dict per iteration with the number of point-to-center
+        distances computed and skipped
+    """
+    if method not in ('hamerly', 'elkan'):
+        print("Error: unknown acceleration method " + str(method) + ".")
+        return None, []
+    centroids = np.asarray(centroids, dtype=float)
+    points = np.asarray(points, dtype=float)
+    k, m = centroids.shape
+    n = len(points)
+    if chunkSize is None:
+        chunkSize = max(1, CHUNK_ENTRIES // max(k, 1))
+    pointNorms = np.einsum('ij,ij->i', points, points)
+    elkan = method == 'elkan'
+
+    # First assignment computes every distance, exactly like clusterPoints
+    labels = np.empty(n, dtype=np.intp)
+    upper = np.empty(n)
+    lower = np.empty((n, k)) if elkan else np.empty(n)
+    margin = roundingMargin(pointNorms, centroids)
+    for start in range(0, n, chunkSize):
+        stop = min(start + chunkSize, n)
+        fullRows(points, pointNorms, centroids, np.arange(start, stop), margin, labels, upper, lower)
+    stats = [{'distances': n * k, 'skipped': 0}]
+
+    newCentroids = updateCentroids(points, labels, k, m, centroids)
+    while not np.allclose(centroids, newCentroids, atol=1e-03):
+        moved = np.sqrt(((newCentroids - centroids) ** 2).sum(axis=1))
+        centroids = newCentroids
+        upper += moved[labels]
+        if elkan:
+            lower -= moved[None, :]
+        elif k > 1:
+            # Each point's other centers moved at most the largest move, or the second largest if its own moved most
+            fastest = np.argsort(moved)[::-1][:2]
+            lower -= np.where(labels == fastest[0], moved[fastest[1]], moved[fastest[0]])
+
+        margin = roundingMargin(pointNorms, centroids)
+        gaps = np.sqrt(squaredDistances(centroids, centroids))
+        gaps -= roundingMargin(np.einsum('ij,ij->i', centroids, centroids), centroids)[:, None]
+        np.fill_diagonal(gaps, np.inf)
+
+        computed = 0
+        for start in range(0, n, chunkSize):
+            chunk = np.arange(start, min(start + chunkSize, n))
+            if elkan:
+                computed += elkanChunk(points, pointNorms, centroids, chunk, margin, gaps, labels, upper, lower)
+            else:
+                computed += hamerlyChunk(points, pointNorms, centroids, chunk, margin, gaps, labels, upper, lower)
+        stats.append({'distances': computed, 'skipped': n * k - computed})
+        newCentroids = updateCentroids(points, labels, k, m, centroids)
+    return centroids, stats
+
+
+def roundingMargin(pointNorms, centroids):
+    """
+    bound on the error of a distance from squaredDistances: its squared value is off by at most
+    gamma * 2 * (||x||^2 + ||c||^2)
+    """
+    gamma = 2 * (centroids.shape[1] + 2) * np.finfo(float).eps
+    return np.sqrt(gamma * 2 * (pointNorms + np.einsum('ij,ij->i', centroids, centroids).max(initial=0)))
+
+
+def fullRows(points, pointNorms, centroids, rows, margin, labels, upper, lower):
+    """
+    assign the given points from all of their distances, as clusterPoints does, and reset their bounds
+    """
+    dist = np.sqrt(squaredDistances(points[rows], centroids, pointNorms[rows]))
+    labels[rows] = np.argmin(dist, axis=1)
+    upper[rows] = dist[np.arange(len(rows)), labels[rows]] + margin[rows]
+    if lower.ndim == 2:
+        lower[rows] = dist - margin[rows, None]
+    else:
+        dist[np.arange(len(rows)), labels[rows]] = np.inf
+        lower[rows] = dist.min(axis=1, initial=np.inf) - margin[rows]
+
+
+def ownDistances(points, centroids, rows, labels, upper):
+    """
+    tighten the upper bounds of the given points to the (directly computed) distance to their own center
+    """
+    own = np.sqrt(((points[rows] - centroids[labels[rows]]) ** 2).sum(axis=1))
+    upper[rows] = own * (1 + 1e-12)
+    return own
+
+
+def hamerlyChunk(points, pointNorms, centroids, chunk, margin, gaps, labels, upper, lower):
+    """
+    one bounded assignment step for a chunk of points with a single lower bound per point
+    :return: number of distances computed
+    """
+    nearestGap = gaps.min(axis=1)
+    # a point keeps its center if even its own center plus twice the margin is nearer than any other could be
+    bound = np.maximum(lower[chunk], nearestGap[labels[chunk]] - upper[chunk])
+    check = chunk[upper[chunk] + 2 * margin[chunk] >= bound]
+    ownDistances(points, centroids, check, labels, upper)
+    bound = np.maximum(lower[check], nearestGap[labels[check]] - upper[check])
+    recompute = check[upper[check] + 2 * margin[check] >= bound]
+    fullRows(points, pointNorms, centroids, recompute, margin, labels, upper, lower)
+    return len(check) + len(recompute) * len(centroids)
+
+
+def elkanChunk(points, pointNorms, centroids, chunk, margin, gaps, labels, upper, lower):
+    """
+    one bounded assignment step for a chunk of points with a lower bound per point and center
+    :return: number of distances computed
+    """
+    k = len(centroids)
+
+    def candidates(rows):
+        # centers the bounds cannot rule out: their lower bound, and half their gap to the own center
+        reach = (upper[rows] + 2 * margin[rows])[:, None]
+        need = (reach >= lower[rows]) & (reach >= gaps[labels[rows]] - upper[rows][:, None])
+        need[np.arange(len(rows)), labels[rows]] = False
+        return need
+
+    check = chunk[candidates(chunk).any(axis=1)]
+    own = ownDistances(points, centroids, check, labels, upper)
+    need = candidates(check)
+    rows = np.flatnonzero(need.any(axis=1))
+    computed = len(check)
+    if len(rows) == 0:
+        return computed
+
+    # Direct distances to the remaining candidate centers only
+    r, j = np.nonzero(need[rows])
+    dist = np.sqrt(((points[check[rows[r]]] - centroids[j]) ** 2).sum(axis=1))
+    computed += len(dist)
+    lower[check[rows[r]], j] = dist * (1 - 1e-12)
+    known = np.full((len(rows), k), np.inf)
+    known[r, j] = dist
+    known[np.arange(len(rows)), labels[check[rows]]] = own[rows]
+    lower[check[rows], labels[check[rows]]] = own[rows] * (1 - 1e-12)
+
+    # Switch to the nearest known center unless another comes within the margin; those rows use clusterPoints' rule
+    best = np.argmin(known, axis=1)
+    bestDist = known[np.arange(len(rows)), best]
+    known[np.arange(len(rows)), best] = np.inf
+    close = known.min(axis=1) - bestDist <= 2 * margin[check[rows]]
+    labels[check[rows]] = best
+    upper[check[rows]] = bestDist * (1 + 1e-12)
+    tied = check[rows[close]]
+    fullRows(points, pointNorms, centroids, tied, margin, labels, upper, lower)
+    return computed + len(tied) * k
+
+
+def clusterPoints(centroids, points, chunkSize=None, pointNorms=None, index='auto'):
     """
     assign data points to clusters (labels)
     :param centroids: numpy array of centroids
     :param points: numpy array of points
-    :return: list of labels
-    """
-    labels = []
-    for p in range(len(points)):
-        dist = sys.maxsize
-        label = -1
-        for c in range(len(centroids)):
-            newDist = distance(centroids[c], points[p])
-            if newDist < dist:
-                dist = newDist
-                label = c
-        labels.append(label)
+    :param chunkSize: number of points assigned at once (default: about 4M distances per chunk)
+    :param pointNorms: squared norms of the points, if already known
+    :param index: 'kdtree' to query a CentroidIndex built over the centroids, 'brute' to compute every distance,
+        'auto' to use the index when useIndex(k, m) expects it to pay off, or an already built CentroidIndex
+    :return: numpy array of labels; ties go to the first nearest centroid
+    """
+    centroids = np.asarray(centroids, dtype=float)
+    points = np.asarray(points, dtype=float)
+    index = resolveIndex(centroids, index)
+    if isinstance(index, CentroidIndex):
+        return index.query(points, 1, pointNorms)[1][:, 0]
+
+    if chunkSize is None:
+        chunkSize = max(1, CHUNK_ENTRIES // max(len(centroids), 1))
+    centroidNorms = np.einsum('ij,ij->i', centroids, centroids)
+
+    labels = np.empty(len(points), dtype=np.intp)
+    for start in range(0, len(points), chunkSize):
+        stop = min(start + chunkSize, len(points))
+        norms = None if pointNorms is None else pointNorms[start:stop]
+        dist = squaredDistances(points[start:stop], centroids, norms, centroidNorms)
+        labels[start:stop] = np.argmin(dist, axis=1)
     return labels
 
 
-def updateCentroids(points, labels, k, m):
+def resolveIndex(centroids, index='auto'):
+    """
+    the CentroidIndex to assign with, or 'brute'
+    :param index: 'auto', 'kdtree', 'brute' or a CentroidIndex (see clusterPoints)
+    """
+    if index == 'auto':
+        index = 'kdtree' if useIndex(*centroids.shape) else 'brute'
+    if index == 'kdtree':
+        index = CentroidIndex(centroids)
+    return index
+
+
+def updateCentroids(points, labels, k, m, previous=None):
     """
     assign each cluster's center of gravity to be the cluster's new center
     :param points: numpy array of data points
     :param labels: list of labels that map each data point to a cluster
     :param k: number of centers/centroids
     :param m: number of dimensions of data
+    :param previous: centers before the update; a cluster without points keeps its previous center (default: origin)
     :return: updated numpy array of centers/centroids
     """
-    centroids = np.zeros((k, m))
-    for c in range(len(centroids)):
-        s = np.zeros((1, m))
-        count = 0
-        for p in range(len(labels)):
-            if labels[p] == c:
-                s = np.add(s, points[p])
-                count += 1
-        centroids[c] = np.true_divide(s, count)
+    points = np.asarray(points, dtype=float)
+    labels = np.asarray(labels, dtype=np.intp)
+    sums, counts = clusterSums(points, labels, k, m)
+    centroids = np.zeros((k, m)) if previous is None else np.array(previous, dtype=float)
+    filled = counts > 0
+    centroids[filled] = sums[filled] / counts[filled, None]
     return centroids
 
 
+def clusterSums(points, labels, k, m):
+    """
+    per-cluster sums of the points and point counts, one bincount per dimension
+    :return: k x m numpy array of sums, numpy array of k counts
+    """
+    counts = np.bincount(labels, minlength=k)
+    sums = np.empty((k, m))
+    for j in range(m):
+        sums[:, j] = np.bincount(labels, weights=points[:, j], minlength=k)
+    return sums, counts
+
+
 def distance(a, b):
     if len(a) != len(b):
         print("Error: a and b have different dimensions!")
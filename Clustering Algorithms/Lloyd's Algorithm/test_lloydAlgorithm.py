@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Lloyd's Algorithm")]
+
+from lloydAlgorithm import LloydAlgorithm, acceleratedLloyd, clusterPoints, updateCentroids
+
+
+def bruteLloyd(centroids: np.ndarray, points: np.ndarray) -> (np.ndarray, int):
+    """ LloydAlgorithm with index='brute', also counting its assignment passes """
+    k, m = centroids.shape
+    labels = clusterPoints(centroids, points, index='brute')
+    newCentroids = updateCentroids(points, labels, k, m, centroids)
+    passes = 1
+    while not np.allclose(centroids, newCentroids, atol=1e-03):
+        centroids = newCentroids
+        labels = clusterPoints(centroids, points, index='brute')
+        newCentroids = updateCentroids(points, labels, k, m, centroids)
+        passes += 1
+    return centroids, passes
+
+
+def datasets():
+    rng = np.random.default_rng(0)
+    means = rng.uniform(-10, 10, (6, 3))
+    mixture = means[rng.integers(6, size=3000)] + rng.normal(size=(3000, 3))
+    yield mixture, mixture[rng.choice(3000, 8, replace=False)]
+    yield mixture * 1e6 + 1e9, (mixture * 1e6 + 1e9)[:5]
+    # Integer lattice with duplicates: many points are exactly equidistant to two or more centers
+    lattice = rng.integers(0, 6, (2000, 2)).astype(float)
+    yield lattice, lattice[:7]
+    yield lattice, np.array([[0.0, 0.0], [2.0, 0.0], [0.0, 2.0], [2.0, 2.0], [4.0, 4.0]])
+    yield lattice, lattice[:1]
+
+
+def testAcceleratedMatchesBruteForce():
+    for points, centroids in datasets():
+        expected, passes = bruteLloyd(centroids, points)
+        assert np.array_equal(LloydAlgorithm(centroids, points, index='brute'), expected)
+        for method in ('hamerly', 'elkan'):
+            for chunkSize in (None, 97):
+                result, stats = acceleratedLloyd(centroids, points, method, chunkSize)
+                assert np.array_equal(result, expected)
+                assert len(stats) == passes
+
+
+def testAcceleratedSkipsDistances():
+    points, centroids = next(datasets())
+    for method in ('hamerly', 'elkan'):
+        stats = acceleratedLloyd(centroids, points, method)[1]
+        assert sum(s['skipped'] for s in stats[1:]) > 0
+
+
+def testAcceleratedRejectsUnsupportedOptions():
+    points, centroids = next(datasets())
+    for options in ({'workers': 2}, {'shardSize': 100}, {'index': 'kdtree'}):
+        with pytest.raises(ValueError):
+            LloydAlgorithm(centroids, points, accelerate='elkan', **options)
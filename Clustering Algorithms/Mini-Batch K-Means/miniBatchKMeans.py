@@ -0,0 +1,119 @@
+import itertools
+import os
+import sys
+import numpy as np
+
+# The shared helpers live in the parent folder, Lloyd's algorithm in a sibling folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in (ROOT, os.path.join(ROOT, "Lloyd's Algorithm")):
+    if folder not in sys.path:
+        sys.path.append(folder)
+from lloydAlgorithm import clusterPoints, clusterSums, squaredDistances
+
+
+class MiniBatchKMeans:
+    """
+    Streaming k-means (Sculley, 2010): centers are updated from one batch of points at a time, so the points never
+    have to be in memory together. Every center keeps the number of points ever assigned to it, and moves towards
+    the mean of its new points with learning rate (new points) / (all points so far), which makes it the running
+    mean of everything assigned to it.
+    """
+
+    def __init__(self, centroids: np.ndarray):
+        """
+        :param centroids: initial centers
+        """
+        self.centroids = np.array(centroids, dtype=float)
+        self.counts = np.zeros(len(self.centroids), dtype=np.int64)
+
+    def partialFit(self, batch: np.ndarray) -> np.ndarray:
+        """
+        assign one batch of points to the current centers and move the centers
+        :param batch: numpy array of data points
+        :return: labels of the batch under the centers before the update
+        """
+        batch = np.asarray(batch, dtype=float)
+        k, m = self.centroids.shape
+        labels = clusterPoints(self.centroids, batch)
+        sums, batchCounts = clusterSums(batch, labels, k, m)
+        self.counts += batchCounts
+        hit = batchCounts > 0
+        rate = batchCounts[hit] / self.counts[hit]
+        self.centroids[hit] += rate[:, None] * (sums[hit] / batchCounts[hit, None] - self.centroids[hit])
+        return labels
+
+
+def miniBatchKMeans(centroids: np.ndarray, source, batchSize: int = 1024, epochs: int = 10,
+                    tolerance: float = 1e-3, skipRows: int = 1, assign: bool = False, seed: int = None):
+    """
+    Runs MiniBatchKMeans over a point source in batches until the centers move less than tolerance over an epoch.
+    Memory stays bounded by the batch size: array sources (e.g. np.memmap) are sliced batch by batch, in a random
+    batch order per epoch, and text files are read batchSize lines at a time.
+
+    :param centroids: initial centers
+    :param source: numpy array or np.memmap of points, or the name of a text file of points (like example1.txt)
+    :param batchSize: points per batch
+    :param epochs: maximum number of passes over the source
+    :param tolerance: stop when no center coordinate moved more than this during an epoch
+    :param skipRows: header lines of a text source
+    :param assign: finish with a streaming pass that labels every point
+    :param seed: random seed of the batch order
+    :return: centers, then the label of every point and the sum of squared distances to the centers (None unless
+        assign)
+    """
+    model = MiniBatchKMeans(centroids)
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        previous = model.centroids.copy()
+        for batch in pointBatches(source, batchSize, skipRows, rng):
+            model.partialFit(batch)
+        if np.allclose(previous, model.centroids, atol=tolerance):
+            break
+    if not assign:
+        return model.centroids, None, None
+    labels, inertia = assignPoints(model.centroids, source, batchSize, skipRows)
+    return model.centroids, labels, inertia
+
+
+def pointBatches(source, batchSize: int, skipRows: int = 1, rng=None):
+    """
+    yield the points of source batchSize at a time
+    :param source: numpy array or np.memmap of points, or the name of a text file of points
+    :param batchSize: points per batch
+    :param skipRows: header lines of a text source
+    :param rng: numpy random generator; if given, array batches come in a random order
+    """
+    if isinstance(source, str):
+        with open(source) as file:
+            for _ in range(skipRows):
+                file.readline()
+            while True:
+                chunk = list(itertools.islice(file, batchSize))
+                if len(chunk) == 0:
+                    break
+                lines = [line for line in chunk if line.strip() != ""]
+                if len(lines) == 0:
+                    continue
+                yield np.fromstring(" ".join(lines), sep=" ").reshape(len(lines), -1)
+    else:
+        starts = np.arange(0, len(source), batchSize)
+        if rng is not None:
+            starts = rng.permutation(starts)
+        for start in starts:
+            yield np.asarray(source[start:start + batchSize], dtype=float)
+
+
+def assignPoints(centroids: np.ndarray, source, batchSize: int = 1024, skipRows: int = 1):
+    """
+    label every point of source with its nearest center, one batch at a time
+    :return: numpy array of labels, sum of squared distances from the points to their centers
+    """
+    centroids = np.asarray(centroids, dtype=float)
+    labels = []
+    inertia = 0.0
+    for batch in pointBatches(source, batchSize, skipRows):
+        dist = squaredDistances(batch, centroids)
+        batchLabels = np.argmin(dist, axis=1)
+        inertia += dist[np.arange(len(batch)), batchLabels].sum()
+        labels.append(batchLabels)
+    return np.concatenate(labels) if len(labels) > 0 else np.zeros(0, dtype=np.intp), inertia
@@ -0,0 +1,78 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# The shared-memory helpers live in the repository root, next to the category folders
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from SharedArrays import shareArrays, releaseArrays, attachArrays, detachArrays
+
+# Arrays of the current run, attached once per worker process
+workerArrays = {}
+
+# Points per shard. Partial results are reduced in shard order, so for a fixed shard size the results do not depend
+# on the number of workers
+SHARD_POINTS = 1 << 15
+
+
+class SharedPool:
+    """
+    Process pool whose workers read a fixed set of numpy arrays from shared memory, attached once per process
+    into workerArrays, so only the small per-task arguments and results are pickled. With one worker the tasks
+    run in this process on the same shared arrays.
+
+        with SharedPool({'points': points}, workers) as pool:
+            partials = pool.map(shardFunction, tasks)
+    """
+
+    def __init__(self, arrays: dict, workers: int = None):
+        """
+        :param arrays: numpy arrays by name, copied into shared memory
+        :param workers: number of processes (default: all cores; 1 runs in this process)
+        """
+        self.arrays = arrays
+        self.workers = workers or os.cpu_count()
+        self.blocks = []
+        self.pool = None
+
+    def __enter__(self) -> 'SharedPool':
+        self.blocks, specs = shareArrays(self.arrays)
+        try:
+            if self.workers == 1:
+                attachWorker(specs)
+            else:
+                self.pool = ProcessPoolExecutor(self.workers, initializer=attachWorker, initargs=(specs,))
+        except BaseException:
+            self.release()
+            raise
+        return self
+
+    def __exit__(self, *exception):
+        if self.pool is not None:
+            self.pool.shutdown()
+        elif 'blocks' in workerArrays:
+            detachArrays(workerArrays)
+        self.release()
+
+    def release(self):
+        releaseArrays(self.blocks)
+        self.blocks = []
+
+    def map(self, function, tasks) -> list:
+        """ results of function for every task, in task order """
+        if self.pool is None:
+            return [function(task) for task in tasks]
+        tasks = list(tasks)
+        return list(self.pool.map(function, tasks, chunksize=max(1, len(tasks) // (self.workers * 4))))
+
+
+def attachWorker(specs: dict):
+    """ Pool initializer: maps the shared arrays into this process's workerArrays. """
+    attachArrays(specs, workerArrays)
+
+
+def shardRanges(n: int, shardSize: int = None) -> list:
+    """ (start, stop) of every shard of n points """
+    shardSize = shardSize or SHARD_POINTS
+    return [(start, min(start + shardSize, n)) for start in range(0, n, shardSize)]
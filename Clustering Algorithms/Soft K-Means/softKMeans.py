@@ -1,8 +1,23 @@
+import contextlib
 import math
+import os
+import sys
 import numpy as np
 
+# The centroid index and shard helpers live in the parent folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from CentroidIndex import CentroidIndex, squaredDistances
+from ParallelShards import SharedPool, shardRanges, workerArrays
 
-def softCluster(B: float, centroids: np.ndarray, points: np.ndarray, n=100):
+# E-step chunks hold about this many point-to-centroid responsibilities
+CHUNK_ENTRIES = 1 << 22
+
+
+def softCluster(B: float, centroids: np.ndarray, points: np.ndarray, n=100, tolerance: float = None,
+                logLikelihoodTolerance: float = None, chunkSize: int = None, nearest: int = None, workers: int = None,
+                shardSize: int = None):
     """
     The soft k-means clustering algorithm starts from randomly chosen centers and iterates the following two steps:
 
@@ -11,52 +26,158 @@ def softCluster(B: float, centroids: np.ndarray, points: np.ndarray, n=100):
         2) Soft Clusters to Centers (M-step): After data points have been assigned to soft clusters, compute
         new centers.
 
-    :param n: number of times e-step and m-step are run
+    Both steps run on chunks of points: each chunk's responsibilities are computed with a stabilized log-sum-exp
+    and folded straight into the M-step sums, so the full k x n responsibility matrix is never stored. With nearest,
+    every point only takes responsibilities from its nearest few centers, found with a KD-tree over the centers
+    (CentroidIndex) rebuilt every step; the others are treated as exactly 0, which is within exp(-B * gap) of the
+    full responsibilities for stiff B.
+
+    With workers, the points are copied into shared memory once and every step runs on a process pool: each fixed
+    shard of points returns its partial M-step sums and log-likelihood, added up in shard order, so the centers
+    depend on the shard size but not on the number of workers.
+
+    :param n: maximum number of times e-step and m-step are run
     :param B: stiffness parameter used calculation later on
     :param centroids: initial centers
     :param points: data points
-    :return: centers after running the algorithm n steps
+    :param tolerance: stop once no center coordinate moves more than this in one step
+    :param logLikelihoodTolerance: stop once the log-likelihood improves by less than this in one step
+    :param chunkSize: number of points per chunk (default: about 4M responsibilities per chunk)
+    :param nearest: number of nearest centers each point is softly assigned to, from 1 to k (default: all)
+    :param workers: run on this many processes (1 runs in this process); default: this process only, unsharded
+    :param shardSize: points per shard when running on workers (default: ParallelShards.SHARD_POINTS)
+    :return: centers after running the algorithm n steps, or until convergence
     """
-    for i in range(n):
-        hiddenMatrix = e_step(B, centroids, points)
-        centroids = m_step(hiddenMatrix, points)
+    centroids = np.asarray(centroids, dtype=float)
+    if nearest is not None and not 1 <= nearest <= len(centroids):
+        print("Error: nearest must be between 1 and k = " + str(len(centroids)) + ", not " + str(nearest) + ".")
+        return None
+    points = np.asarray(points, dtype=float)
+    shards = shardRanges(len(points), shardSize)
+    previousLogLikelihood = -math.inf
+    with SharedPool({'points': points}, workers) if workers is not None else contextlib.nullcontext() as pool:
+        for i in range(n):
+            if pool is None:
+                newCentroids, logLikelihood = softStep(B, centroids, points, chunkSize, nearest)
+            else:
+                newCentroids, logLikelihood = shardedSoftStep(pool, B, centroids, shards, chunkSize, nearest)
+            moved = np.abs(newCentroids - centroids).max(initial=0)
+            centroids = newCentroids
+            if tolerance is not None and moved <= tolerance:
+                break
+            if logLikelihoodTolerance is not None and logLikelihood - previousLogLikelihood <= logLikelihoodTolerance:
+                break
+            previousLogLikelihood = logLikelihood
 
     return centroids
 
 
-def m_step(hiddenMatrix, points):
-    k = len(hiddenMatrix)
-    m = points.shape[1]
-    newCentroids = np.zeros((k, m))
-    for i in range(k):
-        for j in range(m):
-            newCentroids[i][j] = calculate_m_step_entry(i, j, hiddenMatrix, points)
-    return newCentroids
+def softStep(B, centroids, points, chunkSize=None, nearest=None):
+    """
+    one E-step and M-step, chunk by chunk
+    :param nearest: number of nearest centers each point is softly assigned to (default: all)
+    :return: new centers, log-likelihood of the points under the old centers (sum over points of
+        log sum_i exp(-B * distance to center i), over the nearest centers only if nearest is given)
+    """
+    index = CentroidIndex(centroids) if nearest is not None and nearest < len(centroids) else None
+    weighted, totals, logLikelihood = softSums(B, centroids, points, chunkSize, index, nearest)
+    return softCentroids(weighted, totals, centroids), logLikelihood
+
 
+def shardedSoftStep(pool, B, centroids, shards, chunkSize=None, nearest=None):
+    """
+    softStep over the shared points of pool, one task per shard, with the partials added up in shard order
+    """
+    index = CentroidIndex(centroids) if nearest is not None and nearest < len(centroids) else None
+    partials = pool.map(softShard, [(start, stop, B, centroids, chunkSize, index, nearest) for start, stop in shards])
+    weighted = np.zeros(centroids.shape)
+    totals = np.zeros(len(centroids))
+    logLikelihood = 0.0
+    for partialWeighted, partialTotals, partialLogLikelihood in partials:
+        weighted += partialWeighted
+        totals += partialTotals
+        logLikelihood += partialLogLikelihood
+    return softCentroids(weighted, totals, centroids), logLikelihood
+
+
+def softShard(task):
+    """
+    M-step sums of one shard of the shared points
+    :param task: (start, stop, B, centroids, chunkSize, index, nearest) of the shard
+    """
+    start, stop, B, centroids, chunkSize, index, nearest = task
+    return softSums(B, centroids, workerArrays['points'][start:stop], chunkSize, index, nearest)
 
-def calculate_m_step_entry(i, j, hiddenMatrix, points):
-    numerator = np.matmul(hiddenMatrix[i], points[:, j])
-    denominator = np.matmul(hiddenMatrix[i], np.transpose(np.ones(len(points))))
-    return numerator / denominator
+
+def softSums(B, centroids, points, chunkSize=None, index=None, nearest=None):
+    """
+    responsibility-weighted sums of the points and total responsibility of every center, chunk by chunk
+    :param index: CentroidIndex over the centroids to find each point's nearest centers with; None for all centers
+    :return: k x m numpy array of weighted sums, numpy array of k totals, log-likelihood of the points
+    """
+    k, m = centroids.shape
+    if chunkSize is None:
+        chunkSize = max(1, CHUNK_ENTRIES // (nearest if index is not None else max(k, 1)))
+    weighted = np.zeros((k, m))
+    totals = np.zeros(k)
+    logLikelihood = 0.0
+    for start in range(0, len(points), chunkSize):
+        chunk = points[start:start + chunkSize]
+        if index is None:
+            responsibilities, logNormalizer = softResponsibilities(B, centroids, chunk)
+            weighted += responsibilities.T @ chunk
+            totals += responsibilities.sum(axis=0)
+        else:
+            squared, labels = index.query(chunk, nearest)
+            responsibilities, logNormalizer = normalizeLogits(-B * np.sqrt(squared))
+            labels = labels.ravel()
+            totals += np.bincount(labels, weights=responsibilities.ravel(), minlength=k)
+            for j in range(m):
+                shares = (responsibilities * chunk[:, j, None]).ravel()
+                weighted[:, j] += np.bincount(labels, weights=shares, minlength=k)
+        logLikelihood += logNormalizer.sum()
+    return weighted, totals, logLikelihood
+
+
+def softCentroids(weighted, totals, previous):
+    """ M-step: weighted means; a center outside every point's nearest set keeps its position """
+    centroids = previous.copy()
+    held = totals > 0
+    centroids[held] = weighted[held] / totals[held, None]
+    return centroids
+
+
+def softResponsibilities(B, centroids, points):
+    """
+    responsibilities of every center for every point, exp(-B * d_i) / sum_j exp(-B * d_j), computed in the log
+    domain so large B * d cannot underflow to 0/0
+    :return: len(points) x k numpy array of responsibilities, log of every point's normalizer
+    """
+    logits = np.sqrt(squaredDistances(points, centroids))
+    logits *= -B
+    return normalizeLogits(logits)
+
+
+def normalizeLogits(logits):
+    """
+    softmax of every row, in place, after subtracting the row maximum
+    :return: the softmax rows, log of every row's sum of exponentials
+    """
+    peak = logits.max(axis=1, keepdims=True)
+    logits -= peak
+    np.exp(logits, out=logits)
+    normalizer = logits.sum(axis=1, keepdims=True)
+    logits /= normalizer
+    return logits, (np.log(normalizer) + peak)[:, 0]
+
+
+def m_step(hiddenMatrix, points):
+    hiddenMatrix = np.asarray(hiddenMatrix, dtype=float)
+    return (hiddenMatrix @ points) / hiddenMatrix.sum(axis=1)[:, None]
 
 
 def e_step(B, centroids, points):
-    k = len(centroids)
-    n = len(points)
-    hiddenMatrix = np.zeros((k, n))
-    for i in range(k):
-        for j in range(n):
-            hiddenMatrix[i][j] = calculate_e_step_entry(i, j, B, centroids, points)
-    return hiddenMatrix
-
-
-def calculate_e_step_entry(i, j, B, centroids, points):
-    val = -1
-    numerator = math.exp(-B * distance(centroids[i], points[j]))
-    denominator = 0
-    for k in range(len(centroids)):
-        denominator += math.exp(-B * distance(centroids[k], points[j]))
-    return numerator / denominator
+    return softResponsibilities(B, np.asarray(centroids, dtype=float), np.asarray(points, dtype=float))[0].T
 
 
 def distance(a, b):
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Lloyd's Algorithm")]
+
+from CentroidIndex import CentroidIndex, squaredDistances
+from lloydAlgorithm import clusterPoints
+
+
+def bruteNearest(points: np.ndarray, centroids: np.ndarray, count: int) -> (np.ndarray, np.ndarray):
+    """ the count nearest centers by brute force, ties to the lower index """
+    dist = squaredDistances(points, centroids)
+    index = np.broadcast_to(np.arange(len(centroids)), dist.shape)
+    order = np.lexsort((index, dist), axis=1)[:, :count]
+    return np.take_along_axis(dist, order, axis=1), order
+
+
+def testMatchesBruteForceWithTies():
+    # Small integer coordinates keep every squared distance exact, so ties are real ties: duplicate centers, and
+    # points halfway between lattice centers
+    rng = np.random.default_rng(0)
+    for m in (1, 2, 3):
+        centroids = rng.integers(0, 8, (300, m)).astype(float)
+        points = rng.integers(-2, 10, (4000, m)) / 2
+        for leafSize in (1, 4, 64):
+            index = CentroidIndex(centroids, leafSize)
+            for count in (1, 3):
+                dist, ids = index.query(points, count)
+                expectedDist, expectedIds = bruteNearest(points, centroids, count)
+                assert np.array_equal(ids, expectedIds)
+                assert np.array_equal(dist, expectedDist)
+        assert np.array_equal(clusterPoints(centroids, points, index='kdtree'),
+                              clusterPoints(centroids, points, index='brute'))
+
+
+def testMatchesBruteForceOnFloats():
+    rng = np.random.default_rng(1)
+    centroids = rng.normal(size=(1000, 3)) * 100
+    points = rng.normal(size=(5000, 3)) * 100
+    dist, ids = CentroidIndex(centroids, 8).query(points, 2)
+    expectedDist, expectedIds = bruteNearest(points, centroids, 2)
+    assert np.allclose(dist, expectedDist, rtol=1e-9, atol=1e-6)
+    # Away from near-ties the choice is the same
+    clear = expectedDist[:, 1] - expectedDist[:, 0] > 1e-6
+    assert np.array_equal(ids[clear, 0], expectedIds[clear, 0])
+
+
+def testMoreNeighborsThanCenters():
+    centroids = np.array([[0.0, 0.0], [1.0, 0.0]])
+    dist, ids = CentroidIndex(centroids).query(np.array([[0.75, 0.0]]), 5)
+    assert ids.tolist() == [[1, 0]]
+    assert dist.tolist() == [[0.0625, 0.5625]]
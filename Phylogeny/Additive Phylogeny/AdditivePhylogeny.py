@@ -1,100 +1,132 @@
+import os
+import sys
 import numpy as np
 import math
 
-def additivePhylogeny(D: np.ndarray, n: int, newIndexCount: int) -> (dict, dict, int):
+# The condensed matrix and tree types live in the parent folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from CondensedMatrix import CondensedMatrix
+from PhylogenyTree import Tree
+
+def additivePhylogeny(D: np.ndarray, n: int, newIndexCount: int, asTree: bool = False) -> (dict, dict, int):
     """
     Finds the simple fitting tree for an n x n distance matrix D.
 
-    Input: D = distance matrix, n = number of leaves in D, newIndexCount = number of original leaves
-    Returns: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree
+    Works iteratively on a private copy of D. Going down from n leaves to 2, each step trims the limb of the last
+    leaf and records where it attaches: the first pair (i, k) in row-major order whose path passes through the
+    attachment point, and its distance x from i. Going back up, the leaves are added in the same order the recursive
+    formulation added them while unwinding. The tree is kept rooted at leaf 0 with parent pointers, so the i -> k
+    path is found by walking up to the lowest common ancestor of i and k.
+
+    Input: D = distance matrix, n = number of leaves in D, newIndexCount = number of original leaves,
+        asTree = return a Tree (rooted at leaf 0) instead of the adjacency dicts
+    Returns: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree; with asTree, the
+        Tree (see Tree.fromLabels for labels with gaps) and newIndexCount
     """
-    if n == 2:
-        tree = {}
-        tree[0] = [1]
-        tree[1] = [0]
-
-        edgeLength = D[0][1]
-        treeWeights = {}
-        treeWeights = {}
-        treeWeights[(0, 1)] = edgeLength
-        treeWeights[(1, 0)] = edgeLength
-        return tree, treeWeights, newIndexCount
-
-    limbLength = getLimbLength(D, n)
-    for j in range(1, n):
-        D[j-1][n-1] = D[j-1][n-1] - limbLength
-        D[n-1][j-1] = D[j-1][n-1]
-
-    leaf_i_index = -1
-    leaf_k_index = -1
-    x = -1
-    stop = False
-    for i in range(n):
-        for k in range(n):
-            if (D[i][k] == D[i][n-1] + D[n-1][k]):
-                x = D[i][n-1]
+    # A CondensedMatrix is expanded once, straight into the private copy
+    D = D.dense(size=n) if isinstance(D, CondensedMatrix) else np.array(D[:n, :n])
+
+    # Trim limbs from the last leaf down, recording (limbLength, i, k, x) for each leaf
+    attachments = []
+    for size in range(n, 2, -1):
+        limbLength = getLimbLength(D[:size, :size], size)
+        D[:size-1, size-1] -= limbLength
+        D[size-1, :size-1] = D[:size-1, size-1]
+
+        # The trimmed leaf itself is no witness: D[size-1, size-1] is 0, so it would match every i
+        leaf_i_index = -1
+        leaf_k_index = -1
+        for i in range(size-1):
+            witnesses = np.flatnonzero(D[i, :size-1] == D[i][size-1] + D[size-1, :size-1])
+            if len(witnesses) > 0:
                 leaf_i_index = i
-                leaf_k_index = k
-                stop = True
+                leaf_k_index = int(witnesses[0])
                 break
-        if stop:
-            break
-    x = D[leaf_i_index][n-1]
-    tree, treeWeights, newIndexCount = additivePhylogeny(D[:-1, :-1], n-1, newIndexCount)
-    # Add new leaves to tree and update accordingly
-    nearVertex1, nearVertex2, dist1, dist2 = nearest(tree, treeWeights, x, leaf_i_index, leaf_k_index)
-    newVertex = nearVertex1
-    # Check to make sure we need to create new node instead of appending it to end
-    if dist1 != 0:
-        newVertex = newIndexCount
-        newIndexCount += 1
-        # insert newVertex
-        tree[nearVertex1].remove(nearVertex2)
-        tree[nearVertex1].append(newVertex)
-        treeWeights[(nearVertex1, newVertex)] = dist1
-        treeWeights[(newVertex, nearVertex1)] = dist1
-
-        tree[nearVertex2].remove(nearVertex1)
-        tree[nearVertex2].append(newVertex)
-        treeWeights[(nearVertex2, newVertex)] = dist2
-        treeWeights[(newVertex, nearVertex2)] = dist2
-
-        tree[newVertex] = [nearVertex1, nearVertex2]
-        del treeWeights[(nearVertex1, nearVertex2)]
-        del treeWeights[(nearVertex2, nearVertex1)]
-
-    # add limb
-    tree[newVertex].append(n-1)
-    tree[n-1] = [newVertex]
-    treeWeights[(newVertex, n-1)] = limbLength
-    treeWeights[(n-1, newVertex)] = limbLength
+        if leaf_i_index == -1:
+            raise ValueError("D is not additive: no pair of leaves has leaf " + str(size-1)
+                             + "'s attachment point on its path")
+        attachments.append((limbLength, leaf_i_index, leaf_k_index, D[leaf_i_index][size-1]))
+
+    tree = {}
+    tree[0] = [1]
+    tree[1] = [0]
+    edgeLength = D[0][1]
+    treeWeights = {}
+    treeWeights[(0, 1)] = edgeLength
+    treeWeights[(1, 0)] = edgeLength
+    parent = {0: None, 1: 0}
+
+    # Add new leaves to tree and update accordingly, smallest first
+    for leaf, (limbLength, leaf_i_index, leaf_k_index, x) in zip(range(3, n + 1), reversed(attachments)):
+        path = pathBetween(parent, leaf_i_index, leaf_k_index)
+        nearVertex1, nearVertex2, dist1, dist2 = nearestOnPath(path, treeWeights, x)
+        newVertex = nearVertex1
+        # Check to make sure we need to create new node instead of appending it to end
+        if dist1 != 0:
+            newVertex = newIndexCount
+            newIndexCount += 1
+            # insert newVertex
+            tree[nearVertex1].remove(nearVertex2)
+            tree[nearVertex1].append(newVertex)
+            treeWeights[(nearVertex1, newVertex)] = dist1
+            treeWeights[(newVertex, nearVertex1)] = dist1
+
+            tree[nearVertex2].remove(nearVertex1)
+            tree[nearVertex2].append(newVertex)
+            treeWeights[(nearVertex2, newVertex)] = dist2
+            treeWeights[(newVertex, nearVertex2)] = dist2
 
+            tree[newVertex] = [nearVertex1, nearVertex2]
+            del treeWeights[(nearVertex1, nearVertex2)]
+            del treeWeights[(nearVertex2, nearVertex1)]
+
+            # newVertex goes between the lower vertex of the edge and its parent
+            child = nearVertex2 if parent[nearVertex2] == nearVertex1 else nearVertex1
+            parent[newVertex] = parent[child]
+            parent[child] = newVertex
+
+        # add limb
+        tree[newVertex].append(leaf-1)
+        tree[leaf-1] = [newVertex]
+        treeWeights[(newVertex, leaf-1)] = limbLength
+        treeWeights[(leaf-1, newVertex)] = limbLength
+        parent[leaf-1] = newVertex
+
+    if asTree:
+        vertex = list(parent)
+        length = np.array([0 if parent[v] == None else treeWeights[(v, parent[v])] for v in vertex], dtype=D.dtype)
+        return Tree.fromLabels(vertex, [-1 if parent[v] == None else parent[v] for v in vertex], length), newIndexCount
     return tree, treeWeights, newIndexCount
 
-def nearest(tree, treeWeights, x, i, k) -> (int, int, int, int):
+def pathBetween(parent: dict, i: int, k: int) -> list:
+    """
+        Finds the path i -> k in a tree given by parent pointers: up from i to the lowest common ancestor of i and k,
+        then down to k.
+        Return: list of vertices on the path, from i to k
+    """
+    ancestors = {}
+    vertex = i
+    while vertex != None:
+        ancestors[vertex] = len(ancestors)
+        vertex = parent[vertex]
+    down = []
+    vertex = k
+    while vertex not in ancestors:
+        down.append(vertex)
+        vertex = parent[vertex]
+    up = list(ancestors)[:ancestors[vertex] + 1]
+    return up + down[::-1]
+
+def nearestOnPath(path: list, treeWeights: dict, x) -> (int, int, int, int):
     """
-        Finds the nearest two leaves on the path i -> k to our new vertex
-        Return: two nearest vertices to our new vertex and their respective weights
+        Finds the edge of path that contains the point at distance x from the start of the path
+        Return: the two vertices of that edge and the distances from the point to each of them
     """
-    # BFS to find path between i and k
-    queue = [[i]]
-    visited = set([i])
-    findPath = []
-    while len(queue) > 0:
-        path = queue.pop()
-        vertex = path[-1]
-        visited.add(vertex)
-        if vertex == k:
-            findPath = path
-            break
-        else:
-            for nextVertex in tree[vertex]:
-                if nextVertex not in visited:
-                    queue.append(path + [nextVertex])
-    # Determine which two nodes the new vertex lies between
     dist = 0
-    for k in range(len(findPath) - 1):
-        i, j = findPath[k], findPath[k+1]
+    for k in range(len(path) - 1):
+        i, j = path[k], path[k+1]
         if (dist + treeWeights[(i, j)] > x):
             return (i, j, x - dist, dist + treeWeights[(i, j)] - x)
         dist += treeWeights[(i, j)]
@@ -107,7 +139,6 @@ def getLimbLength(D: np.ndarray, n: int) -> int:
 
     # leaf n corespondes to index n - 1
     j = n - 1
-    limbLength = math.inf;
     if len(D) < 3:
         print("Error: Not enough leaves in tree (less than 2).")
         return -1
@@ -117,10 +148,9 @@ def getLimbLength(D: np.ndarray, n: int) -> int:
     if i < 0:
         i = j + 1
 
-    for k in range(len(D)):
-        if k != i and k != j:
-            length = (D[i][j] + D[j][k] -D[i][k])/2
-            if length < limbLength:
-                limbLength = length
+    others = np.ones(len(D), dtype=bool)
+    others[[i, j]] = False
+    lengths = (D[i][j] + D[j][others] - D[i][others])/2
+    limbLength = lengths.min(initial=math.inf)
 
-    return int(limbLength)
\ No newline at end of file
+    return int(limbLength)
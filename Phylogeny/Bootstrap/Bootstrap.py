@@ -0,0 +1,229 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# The shared-memory helpers live in the repository root, the tree types and builders in the Phylogeny folder
+PHYLOGENY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(PHYLOGENY)
+for folder in (ROOT, PHYLOGENY, os.path.join(PHYLOGENY, "Neighbor Joining")):
+    if folder not in sys.path:
+        sys.path.append(folder)
+from SharedArrays import shareArrays, releaseArrays, attachArrays, detachArrays
+from NeighborJoining import neighborJoining, rapidNeighborJoining
+from PhylogenyTree import Tree
+
+# Alignment site patterns of the current run, attached once per worker process
+_worker = {}
+
+# Alignment characters treated as missing data
+GAPS = b"-."
+
+
+def bootstrapSupport(alignment: list, replicates: int = 100, workers: int = None, model: str = 'p',
+                     consensus: bool = True, rapid: bool = False, seed: int = 0,
+                     names: list = None) -> (Tree, np.ndarray):
+    """
+    Bootstrap support for the neighbor joining tree of a multiple alignment. Every replicate resamples the alignment
+    columns with replacement, rebuilds the distance matrix and reruns neighbor joining; replicates run on a process
+    pool that reads the alignment from shared memory. Identical columns are collapsed into site patterns first, so
+    a replicate is just a multinomial draw of pattern weights, and its distances are weighted match counts computed
+    with one matrix product per character. Each replicate's bipartitions are tallied as it arrives in a hash table
+    keyed by the packed leaf set of the side without leaf 0; the replicate trees themselves are never kept.
+
+    Input: alignment = list of equal-length aligned strings (one per leaf), replicates = number of resamplings,
+        workers = number of processes (default: all cores; 1 runs in this process),
+        model = 'p' (p-distance) or 'jc' (Jukes-Cantor corrected), consensus = return the majority-rule consensus
+        of the replicates (otherwise the tree of the full alignment), rapid = use rapidNeighborJoining,
+        seed = random seed (results do not depend on workers), names = leaf names
+    Returns: tree = Tree whose leaves 0, ..., n-1 are the alignment rows and whose inner vertices are named by their
+        support in percent, support = fraction of replicates containing the bipartition above every vertex (nan for
+        leaves and the root)
+    """
+    n = len(alignment)
+    patterns, counts = sitePatterns(alignment)
+    # Bipartitions with their summed branch lengths, and the summed terminal branch lengths
+    table = {}
+    terminal = np.zeros(n)
+    blocks, specs = shareArrays({'patterns': patterns, 'counts': counts})
+    try:
+        settings = (model, rapid, seed)
+        workers = workers or os.cpu_count()
+        if workers == 1:
+            attachAlignment(specs, settings)
+            try:
+                full = None if consensus else alignmentTree(counts)
+                for r in range(replicates):
+                    tallySplits(table, terminal, *bootstrapReplicate(r))
+            finally:
+                detachAlignment()
+        else:
+            with ProcessPoolExecutor(workers, initializer=attachAlignment, initargs=(specs, settings)) as pool:
+                full = None if consensus else pool.submit(fullAlignmentTree)
+                chunk = max(1, replicates // (workers * 4))
+                for result in pool.map(bootstrapReplicate, range(replicates), chunksize=chunk):
+                    tallySplits(table, terminal, *result)
+                if full is not None:
+                    full = full.result()
+    finally:
+        releaseArrays(blocks)
+
+    if consensus:
+        tree, support = majorityConsensus(table, terminal, replicates, n)
+    else:
+        tree = full
+        support = np.array([table.get(key, [0])[0] / replicates if key is not None else np.nan
+                            for key in splitKeys(tree, n)])
+
+    leafNames = names if names != None else [str(i) for i in range(n)]
+    tree.names = [leafNames[v] if v < n else "" if np.isnan(support[v]) else str(int(round(100 * support[v])))
+                  for v in range(tree.vertexCount)]
+    return tree, support
+
+
+def sitePatterns(alignment: list) -> (np.ndarray, np.ndarray):
+    """
+    Collapses identical alignment columns.
+    Return: patterns = n x P matrix of the distinct columns (as bytes), counts = number of columns with each pattern
+    """
+    lengths = set(len(row) for row in alignment)
+    if len(lengths) > 1:
+        raise ValueError("alignment rows have different lengths " + str(sorted(lengths)))
+    columns = np.array([np.frombuffer(row.encode(), dtype=np.uint8) for row in alignment])
+    patterns, counts = np.unique(columns, axis=1, return_counts=True)
+    return np.ascontiguousarray(patterns), counts.astype(np.int64)
+
+
+def patternDistances(onehot: np.ndarray, valid: np.ndarray, weights: np.ndarray, model: str) -> np.ndarray:
+    """
+    Distances between all rows for the given pattern weights: the weighted share of mismatching columns among the
+    columns where neither row has a gap, optionally Jukes-Cantor corrected. Rows without a shared column get the
+    largest distance.
+    """
+    weights = weights.astype(onehot.dtype)
+    # The weighted counts are exact in onehot's dtype; the ratio is taken in float64 so it is not rounded to float32
+    matches = sum((symbol * weights) @ symbol.T for symbol in onehot).astype(np.float64)
+    overlap = ((valid * weights) @ valid.T).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        D = np.where(overlap > 0, 1 - matches / overlap, 1.0)
+    if model == 'jc':
+        # Saturated pairs (p >= 3/4) are capped just below the asymptote
+        D = -0.75 * np.log(1 - 4 / 3 * np.minimum(D, 0.75 - 1e-6))
+    D = np.triu(D, 1)
+    return D + D.T
+
+
+def attachAlignment(specs: dict, settings: tuple):
+    """ Pool initializer: maps the shared site patterns into this process and one-hot encodes them once. """
+    _worker['settings'] = settings
+    attachArrays(specs, _worker)
+    patterns, counts = _worker['patterns'], _worker['counts']
+
+    # Weighted sums stay exact integers in float32 up to 2^24 columns
+    dtype = np.float32 if counts.sum() < (1 << 24) else np.float64
+    symbols = [s for s in np.unique(patterns) if s not in GAPS]
+    _worker['onehot'] = np.array([patterns == s for s in symbols], dtype=dtype).reshape(-1, *patterns.shape)
+    _worker['valid'] = np.isin(patterns, np.frombuffer(GAPS, dtype=np.uint8), invert=True).astype(dtype)
+
+
+def detachAlignment():
+    del _worker['onehot'], _worker['valid']
+    detachArrays(_worker)
+
+
+def alignmentTree(weights: np.ndarray) -> Tree:
+    """ Neighbor joining tree of the shared alignment with the given pattern weights. """
+    model, rapid, _ = _worker['settings']
+    D = patternDistances(_worker['onehot'], _worker['valid'], weights, model)
+    n = len(D)
+    if rapid and n > 2:
+        return rapidNeighborJoining(D, n, asTree=True)[0]
+    return neighborJoining(D, n, asTree=True)[0]
+
+
+def fullAlignmentTree() -> Tree:
+    """ The tree of the full alignment, without resampling. """
+    return alignmentTree(_worker['counts'])
+
+
+def bootstrapReplicate(r: int) -> (list, np.ndarray):
+    """
+    Builds the tree of replicate r and returns only what the tally needs.
+    Return: (bipartition key, edge length) of every nontrivial split, terminal edge lengths of the leaves
+    """
+    seed = _worker['settings'][2]
+    counts = _worker['counts']
+    rng = np.random.default_rng([seed, r])
+    tree = alignmentTree(rng.multinomial(counts.sum(), counts / counts.sum()))
+    n = len(_worker['patterns'])
+    splits = [(key, tree.length[v]) for v, key in enumerate(splitKeys(tree, n)) if key is not None]
+    return splits, tree.length[:n].copy()
+
+
+def tallySplits(table: dict, terminal: np.ndarray, splits: list, terminalLengths: np.ndarray):
+    """ Adds one replicate's bipartitions to table (key -> [count, summed length]) and its terminal lengths. """
+    for key, length in splits:
+        entry = table.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += length
+    terminal += terminalLengths
+
+
+def splitKeys(tree: Tree, n: int) -> list:
+    """
+    Bipartition key of the edge above every vertex: the packed leaf set of the side without leaf 0, or None for the
+    root and for trivial splits. The leaf sets below the vertices are built as packed bits, n / 8 bytes per vertex.
+    """
+    order = [tree.root]
+    for v in order:
+        order.extend(tree.childrenOf(v).tolist())
+    width = (n + 7) // 8
+    below = np.zeros((tree.vertexCount, width), dtype=np.uint8)
+    leaves = np.arange(n)
+    below[leaves, leaves // 8] = 0x80 >> (leaves % 8)
+    sizes = np.zeros(tree.vertexCount, dtype=np.int64)
+    sizes[:n] = 1
+    parent = tree.parent
+    for v in reversed(order):
+        if parent[v] >= 0:
+            below[parent[v]] |= below[v]
+            sizes[parent[v]] += sizes[v]
+
+    # Bits past leaf n-1 in the last byte stay 0 in a complemented side too, as np.packbits would leave them
+    padding = np.full(width, 0xFF, dtype=np.uint8)
+    padding[-1:] = (0xFF << (8 * width - n)) & 0xFF
+    keys = []
+    for v in range(tree.vertexCount):
+        if parent[v] < 0 or sizes[v] < 2 or sizes[v] > n - 2:
+            keys.append(None)
+        else:
+            side = ~below[v] & padding if below[v, 0] & 0x80 else below[v]
+            keys.append(side.tobytes())
+    return keys
+
+
+def majorityConsensus(table: dict, terminal: np.ndarray, replicates: int, n: int) -> (Tree, np.ndarray):
+    """
+    Majority-rule consensus: the bipartitions found in more than half of the replicates, which are always
+    compatible, as a tree rooted next to leaf 0. Branch lengths are the means over the replicates containing them.
+    """
+    majority = [(key, count, total) for key, (count, total) in table.items() if 2 * count > replicates]
+    clades = [np.flatnonzero(np.unpackbits(np.frombuffer(key, dtype=np.uint8), count=n)) for key, _, _ in majority]
+    # Larger clades first, so every clade's parent already exists when it is placed
+    order = sorted(range(len(majority)), key=lambda c: -len(clades[c]))
+
+    root = n
+    parent = np.full(n + 1 + len(majority), -1, dtype=np.int32)
+    length = np.zeros(len(parent))
+    support = np.full(len(parent), np.nan)
+    owner = np.full(n, root)
+    for rank, c in enumerate(order):
+        v = n + 1 + rank
+        parent[v] = owner[clades[c][0]]
+        owner[clades[c]] = v
+        _, count, total = majority[c]
+        length[v] = total / count
+        support[v] = count / replicates
+    parent[:n] = owner
+    length[:n] = terminal / max(replicates, 1)
+    return Tree(parent, length), support
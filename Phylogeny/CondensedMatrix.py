@@ -0,0 +1,129 @@
+import numpy as np
+
+# Binary layout: 32-byte header (magic, n, dtype string), then the upper triangle row by row
+_MAGIC = b"CDMATRIX"
+_HEADER_SIZE = 32
+
+
+class CondensedMatrix:
+    """
+    Symmetric n x n distance matrix with a zero diagonal, storing only the n(n-1)/2 entries above the diagonal in
+    row-major order (the pair order of buildDistanceMatrix). Half the memory of the full matrix, a quarter with
+    float32, and the values can be a np.memmap of a binary file so nothing is read until it is indexed.
+
+    Indexes like the full matrix without expanding it: D[i, j] reads one entry, D[i] builds row i as an array (so
+    D[i][j] costs O(n)); slices such as D[:n, :n] expand only the requested block, and np.array(D) expands everything.
+    """
+    __slots__ = ('values', 'n')
+
+    def __init__(self, values: np.ndarray, n: int):
+        if len(values) != n * (n - 1) // 2:
+            raise ValueError("expected " + str(n * (n - 1) // 2) + " values for n = " + str(n))
+        self.values = values
+        self.n = n
+
+    @classmethod
+    def fromDense(cls, D: np.ndarray, dtype=np.float32) -> 'CondensedMatrix':
+        D = np.asarray(D)
+        i, j = np.triu_indices(len(D), 1)
+        return cls(D[i, j].astype(dtype), len(D))
+
+    @classmethod
+    def load(cls, filename: str, mmap: bool = True) -> 'CondensedMatrix':
+        """ Opens a file written by save or convertMatrixFile, memory-mapped read-only unless mmap is False. """
+        with open(filename, "rb") as file:
+            n, dtype = readHeader(file)
+            if not mmap:
+                return cls(np.fromfile(file, dtype=dtype, count=n * (n - 1) // 2), n)
+        return cls(np.memmap(filename, dtype=dtype, mode="r", offset=_HEADER_SIZE, shape=(n * (n - 1) // 2,)), n)
+
+    def save(self, filename: str):
+        with open(filename, "wb") as file:
+            writeHeader(file, self.n, self.values.dtype)
+            for start in range(0, len(self.values), 1 << 24):
+                file.write(np.ascontiguousarray(self.values[start:start + (1 << 24)]).tobytes())
+
+    @property
+    def shape(self) -> (int, int):
+        return self.n, self.n
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.values.dtype
+
+    def __len__(self) -> int:
+        return self.n
+
+    def offset(self, i, j):
+        """ Position of entry (i, j), i < j, in values; works elementwise on arrays. """
+        return i * self.n - i * (i + 1) // 2 + (j - i - 1)
+
+    def row(self, i: int) -> np.ndarray:
+        """ Row i as a new array: a gather for the columns left of the diagonal, one slice for those right of it. """
+        if i < 0:
+            i += self.n
+        row = np.zeros(self.n, dtype=self.values.dtype)
+        left = np.arange(i)
+        row[:i] = self.values[self.offset(left, i)]
+        start = self.offset(i, i + 1)
+        row[i + 1:] = self.values[start:start + self.n - i - 1]
+        return row
+
+    def block(self, rows, cols) -> np.ndarray:
+        """ Dense submatrix D[rows][:, cols] for index arrays rows and cols, filled one row at a time. """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        everything = np.arange(self.n)
+        if len(rows) == len(cols) == self.n and (rows == everything).all() and (cols == everything).all():
+            return self.dense()
+        block = np.empty((len(rows), len(cols)), dtype=self.values.dtype)
+        for r, i in enumerate(rows.tolist()):
+            block[r] = self.row(i)[cols]
+        return block
+
+    def dense(self, dtype=None, size: int = None) -> np.ndarray:
+        """
+        The full n x n matrix, or its leading size x size block, copied one contiguous row segment of values at a
+        time straight into an array of the given dtype (default: the values' dtype).
+        """
+        size = self.n if size is None else size
+        dense = np.zeros((size, size), dtype=self.values.dtype if dtype is None else dtype)
+        for i in range(size - 1):
+            start = self.offset(i, i + 1)
+            segment = self.values[start:start + size - i - 1]
+            dense[i, i + 1:] = segment
+            dense[i + 1:, i] = segment
+        return dense
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            if np.isscalar(i) and np.isscalar(j):
+                i, j = min(i % self.n, j % self.n), max(i % self.n, j % self.n)
+                return self.values.dtype.type(0) if i == j else self.values[self.offset(i, j)]
+            block = self.block(np.atleast_1d(np.arange(self.n)[i]), np.atleast_1d(np.arange(self.n)[j]))
+            if np.isscalar(i):
+                return block[0]
+            if np.isscalar(j):
+                return block[:, 0]
+            return block
+        if np.isscalar(key):
+            return self.row(int(key))
+        return self.block(np.arange(self.n)[key], np.arange(self.n))
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+
+def writeHeader(file, n: int, dtype):
+    dtypeString = np.dtype(dtype).str.encode()
+    file.write(_MAGIC + np.uint64(n).tobytes() + dtypeString.ljust(_HEADER_SIZE - len(_MAGIC) - 8, b"\0"))
+
+
+def readHeader(file) -> (int, np.dtype):
+    header = file.read(_HEADER_SIZE)
+    if len(header) != _HEADER_SIZE or header[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("not a condensed distance matrix file")
+    n = int(np.frombuffer(header[len(_MAGIC):len(_MAGIC) + 8], dtype=np.uint64)[0])
+    return n, np.dtype(header[len(_MAGIC) + 8:].rstrip(b"\0").decode())
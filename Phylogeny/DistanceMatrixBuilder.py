@@ -0,0 +1,179 @@
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from CondensedMatrix import CondensedMatrix
+
+# The shared-memory helpers live in the repository root, next to the category folders
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from SharedArrays import attachArrays, detachArrays
+
+# Sequences, metric and shared output values of the current build, set once per worker process
+_worker = {}
+
+# Default number of chunks; fixed so the chunk layout, and with it a checkpoint, does not depend on the worker count
+CHUNK_COUNT = 1024
+
+
+def buildDistanceMatrix(sequences: list, metric, workers: int = None, chunkSize: int = None, dtype=np.float64,
+                        checkpoint: str = None, checkpointEvery: int = 16,
+                        condensed: bool = False) -> {np.ndarray, CondensedMatrix}:
+    """
+    Builds the n x n distance matrix of a list of sequences, e.g. as input for neighborJoining or
+    additivePhylogeny. Only the n(n-1)/2 pairs above the diagonal are computed; they are split into equal-sized
+    chunks that a process pool works through, writing straight into a shared output array in condensed pair order.
+
+    If checkpoint is given, the pair values are written into a memory-mapped file next to it (checkpoint + ".values")
+    and the set of finished chunks is saved every checkpointEvery chunks, so a save never rewrites the matrix. A rerun
+    resumes from the last save with the chunk size recorded in the checkpoint, whatever the number of workers; a
+    checkpoint made for a different number of sequences, dtype or chunk size raises ValueError.
+
+    Input: sequences = list of strings, metric = picklable function (s1, s2) -> distance, e.g. editDistance,
+        workers = number of processes (default: all cores; 1 runs in this process),
+        chunkSize = pairs per chunk (default: pairs / CHUNK_COUNT, or the checkpoint's),
+        dtype = matrix type (use int for additivePhylogeny), checkpoint = checkpoint file path (.npz),
+        condensed = store only the pairs above the diagonal (see CondensedMatrix), half the memory
+    Returns: n x n symmetric distance matrix with a zero diagonal, as a CondensedMatrix if condensed
+    """
+    n = len(sequences)
+    pairs = n * (n - 1) // 2
+    workers = workers or os.cpu_count()
+    resumed = checkpoint is not None and os.path.exists(checkpoint)
+    if resumed:
+        done, chunkSize = loadCheckpoint(checkpoint, pairs, dtype, chunkSize)
+    else:
+        chunkSize = chunkSize or max(1, math.ceil(pairs / CHUNK_COUNT))
+        done = np.zeros(math.ceil(pairs / chunkSize), dtype=bool)
+    todo = [c for c in range(len(done)) if not done[c]]
+
+    block = None
+    if checkpoint is not None:
+        target = ('file', checkpoint + ".values")
+        values = openValues(target[1], dtype, pairs, 'r+' if resumed else 'w+')
+    else:
+        block = shared_memory.SharedMemory(create=True, size=max(pairs * np.dtype(dtype).itemsize, 1))
+        target = ('shared', {'values': (block.name, (pairs,), np.dtype(dtype).str)})
+        values = np.ndarray((pairs,), dtype=dtype, buffer=block.buf)
+        values[...] = 0
+    try:
+        spec = (target, np.dtype(dtype).str, chunkSize, pairs)
+        finished = 0
+        if workers == 1:
+            attachWorker(sequences, metric, spec)
+            try:
+                for c in todo:
+                    computeChunk(c)
+                    done[c] = True
+                    finished += 1
+                    if checkpoint is not None and finished % checkpointEvery == 0:
+                        saveCheckpoint(checkpoint, values, done, chunkSize, pairs)
+            finally:
+                detachWorker()
+        else:
+            with ProcessPoolExecutor(workers, initializer=attachWorker, initargs=(sequences, metric, spec)) as pool:
+                futures = [pool.submit(computeChunk, c) for c in todo]
+                for future in as_completed(futures):
+                    done[future.result()] = True
+                    finished += 1
+                    if checkpoint is not None and finished % checkpointEvery == 0:
+                        saveCheckpoint(checkpoint, values, done, chunkSize, pairs)
+
+        if checkpoint is not None:
+            saveCheckpoint(checkpoint, values, done, chunkSize, pairs)
+        result = np.array(values)
+        del values
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+
+    matrix = CondensedMatrix(result, n)
+    return matrix if condensed else matrix.dense()
+
+
+def pairAt(k: int, n: int) -> (int, int):
+    """
+    Returns the k-th pair (i, j), i < j, of the upper triangle of an n x n matrix in row-major order.
+    """
+    # Row i starts at offset i*n - i*(i+1)/2; solve for the last row start <= k, then fix float rounding
+    b = 2 * n - 1
+    i = int((b - math.sqrt(b * b - 8 * k)) // 2)
+    while i > 0 and i * n - i * (i + 1) // 2 > k:
+        i -= 1
+    while (i + 1) * n - (i + 1) * (i + 2) // 2 <= k:
+        i += 1
+    return i, k - (i * n - i * (i + 1) // 2) + i + 1
+
+
+def openValues(filename: str, dtype, pairs: int, mode: str) -> np.ndarray:
+    """ The pair values file of a checkpoint as a memmap (a file cannot map 0 bytes, so it holds at least one). """
+    return np.memmap(filename, dtype=dtype, mode=mode, shape=(max(pairs, 1),))[:pairs]
+
+
+def saveCheckpoint(filename: str, values: np.ndarray, done: np.ndarray, chunkSize: int, pairs: int):
+    # The finished values reach the file before the chunks are marked done; the small state file is written to a
+    # temporary file first so a crash mid-write never leaves a corrupt checkpoint
+    if isinstance(values.base, np.memmap):
+        values.base.flush()
+    temporary = filename + ".tmp.npz"
+    np.savez(temporary, done=done, chunkSize=chunkSize, pairs=pairs, dtype=values.dtype.str)
+    os.replace(temporary, filename)
+
+
+def loadCheckpoint(filename: str, pairs: int, dtype, chunkSize: int = None) -> (np.ndarray, int):
+    """
+    Reads the finished chunks and chunk size of a checkpoint, after checking that it belongs to this build.
+    Returns: done = finished flag per chunk, chunkSize = the checkpoint's chunk size
+    """
+    with np.load(filename) as saved:
+        if 'pairs' not in saved.files:
+            raise ValueError("checkpoint " + filename + " was written in an older format; delete it to start over")
+        savedPairs, savedChunkSize = int(saved['pairs']), int(saved['chunkSize'])
+        savedDtype, done = np.dtype(str(saved['dtype'])), saved['done'].copy()
+    if savedPairs != pairs or savedDtype != np.dtype(dtype):
+        raise ValueError("checkpoint " + filename + " is for " + str(savedPairs) + " pairs of " + str(savedDtype)
+                         + ", not " + str(pairs) + " pairs of " + str(np.dtype(dtype)))
+    if chunkSize is not None and chunkSize != savedChunkSize:
+        raise ValueError("checkpoint " + filename + " uses chunkSize " + str(savedChunkSize) + ", not "
+                         + str(chunkSize))
+    valuesFile = filename + ".values"
+    if not os.path.exists(valuesFile) or os.path.getsize(valuesFile) < pairs * savedDtype.itemsize:
+        raise ValueError("checkpoint values file " + valuesFile + " is missing or truncated")
+    return done, savedChunkSize
+
+
+def attachWorker(sequences: list, metric, spec: tuple):
+    (kind, location), dtype, chunkSize, pairs = spec
+    if kind == 'file':
+        _worker['values'] = openValues(location, np.dtype(dtype), pairs, 'r+')
+    else:
+        attachArrays(location, _worker)
+    _worker['sequences'] = sequences
+    _worker['metric'] = metric
+    _worker['chunk'] = (chunkSize, pairs)
+
+
+def detachWorker():
+    if 'blocks' in _worker:
+        detachArrays(_worker)
+    else:
+        del _worker['values']
+
+
+def computeChunk(c: int) -> int:
+    """ Computes the distances of pairs [c * chunkSize, (c + 1) * chunkSize) into the shared values. """
+    values, sequences, metric = _worker['values'], _worker['sequences'], _worker['metric']
+    chunkSize, pairs = _worker['chunk']
+    n = len(sequences)
+    i, j = pairAt(c * chunkSize, n)
+    for k in range(c * chunkSize, min((c + 1) * chunkSize, pairs)):
+        values[k] = metric(sequences[i], sequences[j])
+        j += 1
+        if j == n:
+            i += 1
+            j = i + 1
+    return c
@@ -0,0 +1,136 @@
+import os
+import sys
+import numpy as np
+
+# The phylogeny helpers live in the parent folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from PhylogenyHelperFunctions import treeDistances
+
+def insertLeaves(tree: dict, treeWeights: dict, newDistanceRows, leaves: list = None,
+                 optimize: bool = False) -> (dict, dict, list):
+    """
+    Adds new leaves to an existing tree (e.g. from neighborJoining or additivePhylogeny) without rebuilding it from
+    the full distance matrix. Each new leaf is placed the way additivePhylogeny attaches its last leaf: its limb
+    length is min over k of (d(x, i) + d(x, k) - D(i, k))/2 for the known leaf i nearest to it, where the tree path
+    lengths stand in for D, and it hangs off the i -> k path at distance d(x, i) - limbLength from i. This takes one
+    walk of the tree, O(n) per leaf.
+
+    Input: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree,
+        newDistanceRows = one row per new leaf with its distances to leaves, in order; a row may go on with the
+            distances to the new leaves before it, which are appended to leaves as they are inserted,
+        leaves = tree vertex of each distance column (default: the degree-one vertices in increasing order),
+        optimize = re-estimate the branch lengths around each attachment point from all of the new leaf's distances
+    Returns: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree,
+        leaves = leaves followed by the vertices of the new leaves
+    """
+    tree = {vertex: list(neighbors) for vertex, neighbors in tree.items()}
+    treeWeights = dict(treeWeights)
+    if leaves == None:
+        leaves = sorted(vertex for vertex in tree if len(tree[vertex]) <= 1)
+    leaves = list(leaves)
+
+    for row in newDistanceRows:
+        row = np.asarray(row)[:len(leaves)]
+        leaves.append(insertLeaf(tree, treeWeights, leaves[:len(row)], row, optimize))
+    return tree, treeWeights, leaves
+
+def insertLeaf(tree: dict, treeWeights: dict, known: list, row: np.ndarray, optimize: bool) -> int:
+    """
+        Attaches one new leaf to the tree in place.
+        Input: known = tree vertices of the leaves in row, row = distances from the new leaf to them
+        Return: vertex of the new leaf
+    """
+    newLeaf = max(tree) + 1 if len(tree) > 0 else 0
+    tree[newLeaf] = []
+    if len(known) < 2:
+        if len(known) == 1:
+            addEdge(tree, treeWeights, known[0], newLeaf, row[0])
+        return newLeaf
+
+    # Limb length against the nearest known leaf i, with tree path lengths standing in for D(i, k)
+    i = int(np.argmin(row))
+    dist, parent = treeDistances(tree, treeWeights, known[i])
+    limbs = (row[i] + row - np.array([dist[leaf] for leaf in known])) / 2
+    limbs[i] = np.inf
+    k = int(np.argmin(limbs))
+    limbLength = max(limbs[k], 0)
+
+    # Walk the i -> k path to the attachment point, clamped to the path for non-additive distances
+    path = [known[k]]
+    while parent[path[-1]] != None:
+        path.append(parent[path[-1]])
+    path.reverse()
+    x = min(max(row[i] - limbLength, 0), dist[known[k]])
+    for a in range(len(path) - 1):
+        nearVertex1, nearVertex2 = path[a], path[a+1]
+        if dist[nearVertex2] > x:
+            break
+    dist1 = x - dist[nearVertex1]
+    dist2 = dist[nearVertex2] - x
+
+    # Attach to an existing inner vertex, otherwise insert a new vertex into the edge (never hang off a leaf)
+    if dist1 == 0 and len(tree[nearVertex1]) > 1:
+        newVertex = nearVertex1
+    elif dist2 == 0 and len(tree[nearVertex2]) > 1:
+        newVertex = nearVertex2
+    else:
+        newVertex = newLeaf + 1
+        tree[newVertex] = []
+        tree[nearVertex1].remove(nearVertex2)
+        tree[nearVertex2].remove(nearVertex1)
+        del treeWeights[(nearVertex1, nearVertex2)]
+        del treeWeights[(nearVertex2, nearVertex1)]
+        addEdge(tree, treeWeights, nearVertex1, newVertex, dist1)
+        addEdge(tree, treeWeights, nearVertex2, newVertex, dist2)
+    addEdge(tree, treeWeights, newVertex, newLeaf, limbLength)
+
+    if optimize:
+        optimizeBranches(tree, treeWeights, known, row, newVertex, newLeaf)
+    return newLeaf
+
+def optimizeBranches(tree: dict, treeWeights: dict, known: list, row: np.ndarray, hub: int, newLeaf: int):
+    """
+        Re-estimates the branches at the attachment vertex hub from all of the new leaf's distances. For the leaves
+        behind each neighbor b of hub, d(x, leaf) - D(b, leaf) estimates limbLength + weight(hub, b); averaging
+        over each side gives the least-squares branch lengths when hub was inserted into an edge (whose total
+        length is kept), and the least-squares limb length when hub is an existing vertex.
+    """
+    dist, parent = treeDistances(tree, treeWeights, hub)
+    # dist lists every vertex after its parent, so each vertex inherits the side of hub it lies on
+    side = {}
+    for vertex in dist:
+        if parent[vertex] == hub:
+            side[vertex] = vertex
+        elif parent[vertex] != None:
+            side[vertex] = side[parent[vertex]]
+
+    residuals = {}
+    for leaf, distance in zip(known, row):
+        b = side[leaf]
+        residuals.setdefault(b, []).append(distance - dist[leaf] + treeWeights[(hub, b)])
+    means = {b: np.mean(values) for b, values in residuals.items()}
+    neighbors = [b for b in tree[hub] if b != newLeaf]
+    if any(b not in means for b in neighbors):
+        return
+
+    if len(neighbors) == 2:
+        b1, b2 = neighbors
+        edgeLength = treeWeights[(hub, b1)] + treeWeights[(hub, b2)]
+        limbLength = max((means[b1] + means[b2] - edgeLength) / 2, 0)
+        dist1 = min(max(means[b1] - limbLength, 0), edgeLength)
+        setWeight(treeWeights, hub, b1, dist1)
+        setWeight(treeWeights, hub, b2, edgeLength - dist1)
+    else:
+        limbLength = max(np.mean([distance - dist[leaf] for leaf, distance in zip(known, row)]), 0)
+    setWeight(treeWeights, hub, newLeaf, limbLength)
+
+def addEdge(tree: dict, treeWeights: dict, i: int, j: int, weight):
+    tree[i].append(j)
+    tree[j].append(i)
+    setWeight(treeWeights, i, j, weight)
+
+def setWeight(treeWeights: dict, i: int, j: int, weight):
+    treeWeights[(i, j)] = weight
+    treeWeights[(j, i)] = weight
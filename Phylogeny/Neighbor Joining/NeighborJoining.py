@@ -1,90 +1,285 @@
-import numpy as np
+import os
 import sys
+import numpy as np
 
-def neighborJoining(D: np.ndarray, n: int, vertexList = None) -> (dict, dict, list):
+# The condensed matrix and tree types live in the parent folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from CondensedMatrix import CondensedMatrix
+from PhylogenyTree import Tree
+
+def neighborJoining(D: np.ndarray, n: int, vertexList = None, asTree: bool = False) -> (dict, dict, list):
     """
         Finds the simple fitting tree for an n x n distance matrix D.
 
+        Works iteratively on a private float copy of D. Each merge writes the new node into the row/column of
+        one of the merged nodes and retires the other by setting its row and column to +inf, as is the diagonal, so
+        inactive entries never win the Q-criterion minimum. Row sums are updated incrementally and the minimum is a
+        single vectorized argmin; ties go to the first pair in the order the recursive formulation would scan them
+        (original leaves first, then new nodes in creation order).
+
+        The result matches the recursive formulation exactly only for integer matrices. On float matrices the
+        incrementally updated row sums can round differently from sums recomputed each step, so an exact tie in Q
+        may resolve to the other pair. For additive matrices only the labels of inner vertices and vertexList can
+        then differ, while the splits and leaf-to-leaf path lengths stay the same; other matrices can also get a
+        different, equally tied topology.
+
         Input: D = n x n distance matrix, n = number of leaves in D,
-                vertexList = maps index in D to vertex in tree
+                vertexList = maps index in D to vertex in tree, asTree = return a Tree instead of the adjacency dicts
         Returns: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree,
-            vertexList = mapping of index of D to vertex in tree
+            vertexList = mapping of index of D to vertex in tree; with asTree, the Tree (see Tree.fromLabels for labels with gaps) and vertexList
         """
 
     if vertexList == None:
         vertexList = list(range(n))
 
-    if n == 2:
-        tree = {}
-        i = vertexList[0]
-        j = vertexList[1]
-        tree[i] = [j]
-        tree[j] = [i]
-
-        edgeLength = D[0][1]
-        treeWeights = {}
-        treeWeights[(i, j)] = edgeLength
-        treeWeights[(j, i)] = edgeLength
-        return tree, treeWeights, vertexList
-
-    # construct neighbor joining matrix according to selection function
-    # u_i = sum_k D(i, k)
-    u = {}
-    for i in range(n):
-        sum = 0
-        for k in range(n):
-            sum += D[i][k]
-        u[vertexList[i]] = sum
-    minScore = sys.maxsize
-    i_min = -1
-    j_min = -1
-    for i in range(n):
-        for j in range(i+1, n):
-            score = (n-2)*D[i][j]-u[vertexList[i]]-u[vertexList[j]]
-            if score < minScore:
-                minScore = score
-                i_min = i
-                j_min = j
-    limb_i = 0.5*(D[i_min][j_min] + (u[vertexList[i_min]]-u[vertexList[j_min]])/(n-2))
-    limb_j = 0.5*(D[i_min][j_min] + (u[vertexList[j_min]]-u[vertexList[i_min]])/(n-2))
-
-    # add new row column D
-    m = vertexList[-1] + 1
-    col = np.zeros([n])
-    for k in range(n):
-        col[k] = 0.5*(D[k][i_min] + D[k][j_min] - D[i_min][j_min])
-    row = np.append(col, 0)
-    D = np.column_stack((D, col))
-    D = np.row_stack((D, row))
-    vertexList.append(m)
-
-    # remove rows/columns i and j from D
-    D = np.delete(D, (i_min, j_min), 0)
-    D = np.delete(D, (i_min, j_min), 1)
-    vertex_i = vertexList[i_min]
-    vertex_j = vertexList[j_min]
-    vertexList.remove(vertex_i)
-    vertexList.remove(vertex_j)
-    tree, treeWeights, vertexList = neighborJoining(D, n-1, vertexList)
-
-    # Add two new limbs (connecting node m with leaves i and j) to the tree
-    if vertex_i not in tree.keys():
-        tree[vertex_i] = [m]
-    else:
-        tree[vertex_i].append(m)
-    if vertex_j not in tree.keys():
-        tree[vertex_j] = [m]
-    else:
-        tree[vertex_j].append(m)
-    if m not in tree.keys():
-        tree[m] = [vertex_i, vertex_j]
+    D, u, active, labels, rank = initJoining(D, n, vertexList, float)
+    Q = np.empty_like(D)
+
+    # construct neighbor joining matrix according to selection function, one merge per step
+    merges = []
+    for size in range(n, 2, -1):
+        # Q(i, j) = (size-2)*D(i, j) - u_i - u_j, u_i = sum_k D(i, k)
+        np.multiply(D, size - 2, out=Q)
+        Q -= u[:, None]
+        Q -= u[None, :]
+        minScore = Q.flat[np.argmin(Q)]
+        a, b = np.divmod(np.flatnonzero(Q == minScore), n)
+        i_min, j_min = firstPair(a, b, rank)
+        joinPair(D, u, active, labels, rank, merges, i_min, j_min, size, vertexList[-1] + 1 + len(merges))
+
+    if asTree:
+        return mergeTree(D, active, labels, rank, merges)
+    return buildTree(D, active, labels, rank, merges)
+
+
+def rapidNeighborJoining(D: np.ndarray, n: int, vertexList = None, dtype = np.float64,
+                         asTree: bool = False) -> (dict, dict, list, dict):
+    """
+        Neighbor joining with a bounded search for the Q-criterion minimum, after RapidNJ (Simonsen et al., 2008),
+        for trees with tens of thousands of leaves.
+
+        Every row keeps its distances sorted. Since Q(i, j) >= (size-2)*D(i, j) - u_i - max(u), row i can only hold
+        a pair beating the current best Q while D(i, j) <= (best + u_i + max(u)) / (size-2), so only that prefix of
+        each sorted row is evaluated. After a merge only the new node's row is re-sorted; entries of other rows that
+        point at merged nodes go stale, but every pair is still found through the row of its newer node, and stale
+        entries are evaluated against the current D, so they can only cost time. All sorted rows are rebuilt
+        whenever half of their columns have been retired.
+
+        With the default dtype this returns exactly the tree of neighborJoining, including tie-breaking.
+        dtype = np.float32 halves the memory of D and of the sorted rows; Q is still evaluated in float64.
+
+        Input: D = n x n distance matrix, n = number of leaves in D,
+                vertexList = maps index in D to vertex in tree, dtype = storage type of distances,
+                asTree = return a Tree instead of the adjacency dicts
+        Returns: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree,
+            vertexList = mapping of index of D to vertex in tree, stats = number of Q evaluations done and skipped;
+            with asTree, the Tree, vertexList and stats
+        """
+
+    if vertexList == None:
+        vertexList = list(range(n))
+
+    D, u, active, labels, rank = initJoining(D, n, vertexList, dtype)
+    stats = {'qEvaluations': 0, 'qSkipped': 0}
+    merges = []
+    sortedD, sortedCols = sortRows(D, active)
+    newRow = None
+    for size in range(n, 2, -1):
+        if 2 * size <= sortedD.shape[1]:
+            # Release the old rows first, so the old and new rows are never held at once
+            sortedD = sortedCols = None
+            sortedD, sortedCols = sortRows(D, active)
+        rows = np.flatnonzero(active)
+        umax = u[rows].max()
+
+        # Any evaluated Q bounds the minimum: take the best of the first few sorted entries of every row, and of
+        # the whole row of the last new node
+        seeds = min(4, sortedD.shape[1])
+        seedRows = np.repeat(rows, seeds)
+        seedCols = sortedCols[rows, :seeds].ravel()
+        if newRow is not None:
+            seedRows = np.concatenate([seedRows, np.full(len(rows), newRow)])
+            seedCols = np.concatenate([seedCols, rows])
+        qmin = qScores(D, u, seedRows, seedCols, size).min()
+
+        # Prefix of each sorted row that can still reach qmin, by a binary search over all rows at once
+        threshold = (qmin + u[rows] + umax) / (size - 2)
+        threshold += 1e-9 * (abs(qmin) + np.abs(u[rows]) + abs(umax)) / (size - 2)
+        lo = np.zeros(len(rows), dtype=np.intp)
+        hi = np.full(len(rows), sortedD.shape[1], dtype=np.intp)
+        while True:
+            searching = lo < hi
+            if not searching.any():
+                break
+            mid = (lo + hi) // 2
+            below = sortedD[rows, np.minimum(mid, sortedD.shape[1] - 1)] <= threshold
+            lo = np.where(searching & below, mid + 1, lo)
+            hi = np.where(searching & ~below, mid, hi)
+
+        candidateRows = np.repeat(rows, lo)
+        offsets = np.arange(len(candidateRows)) - np.repeat(np.cumsum(lo) - lo, lo)
+        candidateCols = sortedCols[candidateRows, offsets]
+        Q = qScores(D, u, candidateRows, candidateCols, size)
+        minScore = Q.min()
+        ties = Q == minScore
+        i_min, j_min = firstPair(candidateRows[ties], candidateCols[ties], rank)
+
+        evaluations = len(seedRows) + len(candidateRows)
+        stats['qEvaluations'] += evaluations
+        stats['qSkipped'] += max(0, size * (size - 1) // 2 - evaluations)
+
+        col = joinPair(D, u, active, labels, rank, merges, i_min, j_min, size, vertexList[-1] + 1 + len(merges))
+        rows = np.flatnonzero(active)
+        order = rows[np.argsort(col[rows], kind='stable')]
+        sortedD[i_min] = np.inf
+        sortedCols[i_min] = i_min
+        sortedD[i_min, :len(order)] = col[order]
+        sortedCols[i_min, :len(order)] = order
+        newRow = i_min
+
+    if asTree:
+        return mergeTree(D, active, labels, rank, merges) + (stats,)
+    tree, treeWeights, vertexList = buildTree(D, active, labels, rank, merges)
+    return tree, treeWeights, vertexList, stats
+
+
+def sortRows(D: np.ndarray, active: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+        Sorts the active part of every active row of D.
+        Returns: sortedD = row-wise sorted distances (+inf past the end), sortedCols = their columns in D
+    """
+    rows = np.flatnonzero(active)
+    sortedD = np.full((len(D), len(rows)), np.inf, dtype=D.dtype)
+    sortedCols = np.zeros((len(D), len(rows)), dtype=np.int32 if len(D) < 2**31 else np.int64)
+    for row in rows:
+        order = np.argsort(D[row, rows], kind='stable')
+        sortedD[row] = D[row, rows[order]]
+        sortedCols[row] = rows[order]
+    return sortedD, sortedCols
+
+
+def qScores(D: np.ndarray, u: np.ndarray, rows: np.ndarray, cols: np.ndarray, size: int) -> np.ndarray:
+    """
+        Q(i, j) = (size-2)*D(i, j) - u_i - u_j for the given pairs, in float64. Rounding can make Q(i, j) and
+        Q(j, i) differ in the last bit; neighborJoining sees both, so the smaller one is returned.
+    """
+    scaled = D[rows, cols].astype(float)
+    scaled *= size - 2
+    return np.minimum(scaled - u[rows] - u[cols], scaled - u[cols] - u[rows])
+
+
+def initJoining(D: np.ndarray, n: int, vertexList: list, dtype) -> (np.ndarray, np.ndarray, np.ndarray, list,
+                                                                   np.ndarray):
+    """
+        Sets up the in-place joining state: a private copy of D with +inf on the diagonal, row sums u, the active
+        mask, the tree vertex of every row and every row's rank in vertexList order. A CondensedMatrix is expanded
+        straight into the working dtype, without an intermediate dense copy.
+    """
+    if isinstance(D, CondensedMatrix):
+        D = D.dense(dtype, n)
     else:
-        tree[m].append(vertex_i)
-        tree[m].append(vertex_j)
+        D = np.array(D[:n, :n], dtype=dtype)
+    np.fill_diagonal(D, 0)
+    u = D.sum(axis=1, dtype=float)
+    np.fill_diagonal(D, np.inf)
+    return D, u, np.ones(n, dtype=bool), list(vertexList), np.arange(n)
+
+
+def firstPair(a: np.ndarray, b: np.ndarray, rank: np.ndarray) -> (int, int):
+    """
+        Among the minimal pairs (a[k], b[k]), returns the one the recursive formulation would have found first:
+        the smallest (rank of first row, rank of second row), ordered so that i comes before j in vertexList.
+    """
+    first = np.minimum(rank[a], rank[b])
+    second = np.maximum(rank[a], rank[b])
+    k = np.lexsort((second, first))[0]
+    return (int(a[k]), int(b[k])) if rank[a[k]] < rank[b[k]] else (int(b[k]), int(a[k]))
+
 
-    treeWeights[(vertex_i, m)] = limb_i
-    treeWeights[(m, vertex_i)] = limb_i
-    treeWeights[(vertex_j, m)] = limb_j
-    treeWeights[(m, vertex_j)] = limb_j
+def joinPair(D: np.ndarray, u: np.ndarray, active: np.ndarray, labels: list, rank: np.ndarray, merges: list,
+             i_min: int, j_min: int, size: int, m: int) -> np.ndarray:
+    """
+        Joins rows i_min and j_min of the size active rows into new vertex m, recording the merge and its limb
+        lengths. Vertex m takes over row/column i_min; row/column j_min is retired (set to +inf).
+        Returns: distances from m to every row
+    """
+    limb_i = 0.5*(D[i_min][j_min] + (u[i_min]-u[j_min])/(size-2))
+    limb_j = 0.5*(D[i_min][j_min] + (u[j_min]-u[i_min])/(size-2))
+    merges.append((labels[i_min], labels[j_min], m, limb_i, limb_j))
+
+    # distances to the new node m
+    col = 0.5*(D[:, i_min] + D[:, j_min] - D[i_min][j_min])
+    others = active.copy()
+    others[[i_min, j_min]] = False
+    u[others] += col[others] - D[others, i_min] - D[others, j_min]
+    u[i_min] = col[others].sum()
+    u[j_min] = 0
+    D[i_min, :] = col
+    D[:, i_min] = col
+    D[i_min][i_min] = np.inf
+    D[j_min, :] = np.inf
+    D[:, j_min] = np.inf
+    active[j_min] = False
+    labels[i_min] = m
+    rank[i_min] = len(rank) + len(merges)
+    return D[i_min]
+
+
+def buildTree(D: np.ndarray, active: np.ndarray, labels: list, rank: np.ndarray, merges: list) -> (dict, dict, list):
+    """
+        Builds the tree from the last two active rows and the recorded merges, in the same order the recursive
+        formulation added edges while unwinding.
+    """
+    # the two remaining vertices, in vertexList order
+    i, j = sorted(np.flatnonzero(active), key=lambda slot: rank[slot])
+    edgeLength = D[i][j]
+    vertexList = [labels[i], labels[j]]
+    i, j = vertexList
+    tree = {}
+    tree[i] = [j]
+    tree[j] = [i]
+    treeWeights = {}
+    treeWeights[(i, j)] = edgeLength
+    treeWeights[(j, i)] = edgeLength
+
+    # Add two new limbs (connecting node m with leaves i and j) to the tree, last merge first
+    for vertex_i, vertex_j, m, limb_i, limb_j in reversed(merges):
+        if vertex_i not in tree.keys():
+            tree[vertex_i] = [m]
+        else:
+            tree[vertex_i].append(m)
+        if vertex_j not in tree.keys():
+            tree[vertex_j] = [m]
+        else:
+            tree[vertex_j].append(m)
+        if m not in tree.keys():
+            tree[m] = [vertex_i, vertex_j]
+        else:
+            tree[m].append(vertex_i)
+            tree[m].append(vertex_j)
+
+        treeWeights[(vertex_i, m)] = limb_i
+        treeWeights[(m, vertex_i)] = limb_i
+        treeWeights[(vertex_j, m)] = limb_j
+        treeWeights[(m, vertex_j)] = limb_j
+
+    return tree, treeWeights, vertexList
+
+
+def mergeTree(D: np.ndarray, active: np.ndarray, labels: list, rank: np.ndarray, merges: list) -> (Tree, list):
+    """
+        Builds the tree from the recorded merges straight into a Tree: every merge is the parent of the two vertices
+        it joined, and the last two active rows are joined with the second one as the root. Labels with gaps (a
+        vertexList not starting at 0) are renumbered and kept as names, see Tree.fromLabels.
+    """
+    i, j = sorted(np.flatnonzero(active), key=lambda slot: rank[slot])
+    vertexList = [labels[i], labels[j]]
+    joined = np.array([merge[:3] for merge in merges], dtype=np.int64).reshape(-1, 3)
+    limbs = np.array([merge[3:] for merge in merges], dtype=float).reshape(-1, 2)
 
-    return tree, treeWeights, vertexList
\ No newline at end of file
+    vertex = np.concatenate([joined[:, 0], joined[:, 1], vertexList])
+    parent = np.concatenate([joined[:, 2], joined[:, 2], [vertexList[1], -1]])
+    length = np.concatenate([limbs[:, 0], limbs[:, 1], [D[i][j], 0]])
+    return Tree.fromLabels(vertex, parent, length), vertexList
@@ -0,0 +1,148 @@
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Neighbor Joining")]
+
+from NeighborJoining import neighborJoining, rapidNeighborJoining
+
+
+def recursiveNeighborJoining(D: np.ndarray, n: int, vertexList=None) -> (dict, dict, list):
+    """ The original recursive implementation, kept as the reference output. """
+    if vertexList == None:
+        vertexList = list(range(n))
+    if n == 2:
+        i, j = vertexList
+        return {i: [j], j: [i]}, {(i, j): D[0][1], (j, i): D[0][1]}, vertexList
+
+    u = {vertexList[i]: sum(D[i][k] for k in range(n)) for i in range(n)}
+    minScore = sys.maxsize
+    i_min = j_min = -1
+    for i in range(n):
+        for j in range(i + 1, n):
+            score = (n - 2) * D[i][j] - u[vertexList[i]] - u[vertexList[j]]
+            if score < minScore:
+                minScore, i_min, j_min = score, i, j
+    limb_i = 0.5 * (D[i_min][j_min] + (u[vertexList[i_min]] - u[vertexList[j_min]]) / (n - 2))
+    limb_j = 0.5 * (D[i_min][j_min] + (u[vertexList[j_min]] - u[vertexList[i_min]]) / (n - 2))
+
+    m = vertexList[-1] + 1
+    col = np.array([0.5 * (D[k][i_min] + D[k][j_min] - D[i_min][j_min]) for k in range(n)])
+    D = np.vstack((np.column_stack((D, col)), np.append(col, 0)))
+    vertexList.append(m)
+    D = np.delete(np.delete(D, (i_min, j_min), 0), (i_min, j_min), 1)
+    vertex_i, vertex_j = vertexList[i_min], vertexList[j_min]
+    vertexList.remove(vertex_i)
+    vertexList.remove(vertex_j)
+    tree, treeWeights, vertexList = recursiveNeighborJoining(D, n - 1, vertexList)
+
+    tree.setdefault(vertex_i, []).append(m)
+    tree.setdefault(vertex_j, []).append(m)
+    tree.setdefault(m, []).extend([vertex_i, vertex_j])
+    treeWeights[(vertex_i, m)] = treeWeights[(m, vertex_i)] = limb_i
+    treeWeights[(vertex_j, m)] = treeWeights[(m, vertex_j)] = limb_j
+    return tree, treeWeights, vertexList
+
+
+def leafDistances(tree: dict, treeWeights: dict, n: int) -> np.ndarray:
+    distances = np.zeros([n, n])
+    for leaf in range(n):
+        dist = {leaf: 0}
+        stack = [leaf]
+        while stack:
+            v = stack.pop()
+            for w in tree[v]:
+                if w not in dist:
+                    dist[w] = dist[v] + treeWeights[(v, w)]
+                    stack.append(w)
+        distances[leaf] = [dist[other] for other in range(n)]
+    return distances
+
+
+def splits(tree: dict, n: int) -> set:
+    """ Leaf sets cut off by the inner edges, each given as the side without leaf 0. """
+    result = set()
+    for v in tree:
+        for w in tree[v]:
+            seen = {v, w}
+            stack = [w]
+            leaves = set()
+            while stack:
+                x = stack.pop()
+                if x < n:
+                    leaves.add(x)
+                for y in tree[x]:
+                    if y not in seen:
+                        seen.add(y)
+                        stack.append(y)
+            side = frozenset(leaves) if 0 not in leaves else frozenset(range(n)) - leaves
+            if 1 < len(side) < n - 1:
+                result.add(side)
+    return result
+
+
+def randomAdditiveMatrix(rng, n: int) -> np.ndarray:
+    """ Leaf distances of a random binary tree with edge lengths 0.1 and 0.2, so the matrix is full of ties. """
+    tree = {0: [1], 1: [0]}
+    treeWeights = {(0, 1): 0.1, (1, 0): 0.1}
+    for leaf in range(2, n):
+        edges = [(a, b) for a in tree for b in tree[a] if a < b]
+        a, b = edges[rng.integers(len(edges))]
+        m = n + leaf
+        tree[a].remove(b)
+        tree[b].remove(a)
+        tree[a].append(m)
+        tree[b].append(m)
+        tree[m] = [a, b, leaf]
+        tree[leaf] = [m]
+        del treeWeights[(a, b)], treeWeights[(b, a)]
+        for x in (a, b, leaf):
+            treeWeights[(x, m)] = treeWeights[(m, x)] = rng.integers(1, 3) * 0.1
+    return leafDistances(tree, treeWeights, n)
+
+
+def testMatchesRecursiveOnIntegerMatrices():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(3, 9))
+        # Values 1-3 make the Q-criterion full of exact ties
+        D = np.triu(rng.integers(1, 4, (n, n)), 1)
+        D = D + D.T
+        assert neighborJoining(D.copy(), n) == recursiveNeighborJoining(D.copy(), n)
+
+
+def testAdditiveFloatMatricesWithTies():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        n = int(rng.integers(4, 10))
+        D = randomAdditiveMatrix(rng, n)
+        tree, treeWeights, _ = neighborJoining(D.copy(), n)
+        reference, referenceWeights, _ = recursiveNeighborJoining(D.copy(), n)
+        assert splits(tree, n) == splits(reference, n)
+        assert np.allclose(leafDistances(tree, treeWeights, n), D)
+        assert np.allclose(leafDistances(reference, referenceWeights, n), D)
+
+
+def testTiesOnNonAdditiveMatrix():
+    # The Q-criterion ties exactly at several steps; integer input resolves every tie like the recursive version
+    D = np.array([[0, 1, 1, 1, 1],
+                  [1, 0, 2, 1, 1],
+                  [1, 2, 0, 2, 2],
+                  [1, 1, 2, 0, 3],
+                  [1, 1, 2, 3, 0]])
+    n = len(D)
+    assert neighborJoining(D.copy(), n) == recursiveNeighborJoining(D.copy(), n)
+    assert splits(neighborJoining(D.copy(), n)[0], n) == {frozenset({1, 3}), frozenset({1, 3, 4})}
+    assert neighborJoining(D.astype(float), n) == recursiveNeighborJoining(D.astype(float), n)
+
+
+def testRapidMatchesNeighborJoining():
+    rng = np.random.default_rng(2)
+    for _ in range(100):
+        n = int(rng.integers(3, 12))
+        D = np.triu(rng.integers(1, 6, (n, n)), 1) * 0.5
+        D = D + D.T
+        tree, treeWeights, vertexList, _ = rapidNeighborJoining(D.copy(), n)
+        assert (tree, treeWeights, vertexList) == neighborJoining(D.copy(), n)
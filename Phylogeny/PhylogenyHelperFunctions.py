@@ -1,4 +1,7 @@
+import sys
 import numpy as np
+from PhylogenyTree import Tree
+from CondensedMatrix import CondensedMatrix, writeHeader
 
 def loadMatrixFile(filename):
     """
@@ -12,17 +15,70 @@ def loadMatrixFile(filename):
     """
     with open(filename) as file:
         dim = int(file.readline())
-        matrix = [[int(entry) for entry in line.split()] for line in file]
-        matrix = np.array([np.array(row) for row in matrix])
+        matrix = np.fromstring(file.read(), dtype=np.int64, sep=" ").reshape(-1, dim)
         return matrix, dim
 
-def printPhylogenyTree(tree: dict, treeWeights: dict):
+def convertMatrixFile(textFilename: str, binaryFilename: str, dtype=np.float32) -> CondensedMatrix:
+    """
+    Converts a text matrix file (see loadMatrixFile) into the binary condensed format of CondensedMatrix, reading
+    one row at a time and writing only its entries right of the diagonal, so the full matrix is never in memory.
+
+    Input: textFilename = text matrix file, binaryFilename = output file, dtype = stored type (float32 by default,
+        a quarter of the memory of the full int64 matrix)
+    Return: the converted matrix, memory-mapped from binaryFilename
+    """
+    with open(textFilename) as text, open(binaryFilename, "wb") as binary:
+        dim = int(text.readline())
+        writeHeader(binary, dim, dtype)
+        i = 0
+        for line in text:
+            if line.strip() == "":
+                continue
+            row = np.fromstring(line, dtype=np.float64 if np.dtype(dtype).kind == "f" else np.int64, sep=" ")
+            binary.write(row[i + 1:dim].astype(dtype).tobytes())
+            i += 1
+    return CondensedMatrix.load(binaryFilename)
+
+def saveMatrixFile(matrix: np.ndarray, filename: str):
+    """
+    Writes an n x n distance matrix in the format read by loadMatrixFile: n on the first line, then one
+    tab-delimited row per line.
+    """
+    with open(filename, "w") as file:
+        file.write(str(len(matrix)) + "\n")
+        for row in matrix:
+            file.write("\t".join(str(entry) for entry in row) + "\n")
+
+def treeDistances(tree: dict, treeWeights: dict, source: int) -> (dict, dict):
+    """
+    Walks the tree from source without recursion.
+
+    Input: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree, source = start vertex
+    Returns: dist = path length from source to every vertex, parent = next vertex on the path back to source
+        (None for source)
+    """
+    dist = {source: 0}
+    parent = {source: None}
+    stack = [source]
+    while len(stack) > 0:
+        vertex = stack.pop()
+        for nextVertex in tree[vertex]:
+            if nextVertex != parent[vertex]:
+                dist[nextVertex] = dist[vertex] + treeWeights[(vertex, nextVertex)]
+                parent[nextVertex] = vertex
+                stack.append(nextVertex)
+    return dist, parent
+
+def printPhylogenyTree(tree: {dict, Tree}, treeWeights: dict = None):
     """
     Prints Phylogeny tree in readable format. The n leaves are labeled 0, 1, ..., n-1 in order of their appearance
     in the distance matrix.
 
-    Input: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree
+    Input: tree = adjacency list of tree (or a Tree), treeWeights = edgeWeights between vertices in our tree
     """
+    if isinstance(tree, Tree):
+        tree.writeEdgeList(sys.stdout)
+        return
     for i in sorted(tree):
         for j in sorted(tree[i]):
             print(str(i) + "->" + str(j) + ":" + str(treeWeights[(i,j)]))
\ No newline at end of file
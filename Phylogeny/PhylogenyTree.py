@@ -0,0 +1,298 @@
+import re
+import numpy as np
+
+# Newick tokens: quoted label, punctuation, or a bare label/number
+_NEWICK_TOKEN = re.compile(r"\s*('(?:[^']|'')*'|[(),;:]|[^\s(),;:']+)")
+_NEWICK_SPECIAL = re.compile(r"[\s(),;:'\[\]]")
+
+
+class Tree:
+    """
+    Rooted phylogeny tree stored in flat arrays instead of an adjacency dict, for trees with tens of thousands of
+    leaves. Vertices are 0, 1, ..., vertexCount-1 as in the builders' output; each edge is stored once, as the
+    parent and edge length of its lower vertex, and children are kept in CSR form (the children of v are
+    children[childOffsets[v]:childOffsets[v+1]]).
+
+    parent = parent of every vertex (-1 for the root), length = length of the edge to the parent (0 for the root),
+    names = optional label of every vertex for Newick output (default: the vertex number)
+    """
+    __slots__ = ('parent', 'length', 'childOffsets', 'children', 'names')
+
+    def __init__(self, parent, length, names: list = None):
+        self.parent = np.asarray(parent, dtype=np.int32)
+        self.length = np.asarray(length)
+        self.names = names
+        counts = np.bincount(self.parent[self.parent >= 0], minlength=len(self.parent))
+        self.childOffsets = np.zeros(len(self.parent) + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.childOffsets[1:])
+        order = np.argsort(self.parent, kind='stable').astype(np.int32)
+        self.children = order[len(order) - int(self.childOffsets[-1]):]
+
+    @property
+    def vertexCount(self) -> int:
+        return len(self.parent)
+
+    @property
+    def root(self) -> int:
+        return int(np.flatnonzero(self.parent < 0)[0])
+
+    def childrenOf(self, v: int) -> np.ndarray:
+        return self.children[self.childOffsets[v]:self.childOffsets[v + 1]]
+
+    def leaves(self) -> np.ndarray:
+        """ Vertices of degree one, in increasing order (the root counts when it has a single child). """
+        degree = np.diff(self.childOffsets) + (self.parent >= 0)
+        return np.flatnonzero(degree == 1)
+
+    def name(self, v: int) -> str:
+        if self.names is None:
+            return str(v)
+        return self.names[v]
+
+    @classmethod
+    def fromEdges(cls, i, j, weights, root: int = 0, names: list = None) -> 'Tree':
+        """
+        Roots an unrooted tree given as an edge list at vertex root.
+
+        Input: i, j, weights = endpoints and length of every edge (each edge once), root = vertex to root at,
+            names = optional vertex labels
+        Return: Tree
+        """
+        i = np.asarray(i, dtype=np.int64)
+        j = np.asarray(j, dtype=np.int64)
+        weights = np.asarray(weights)
+        vertexCount = int(max(i.max(initial=-1), j.max(initial=-1), root)) + 1
+
+        # Undirected adjacency in CSR form, then a breadth-first walk from root
+        ends = np.concatenate([i, j])
+        others = np.concatenate([j, i])
+        edgeWeights = np.concatenate([weights, weights])
+        order = np.argsort(ends, kind='stable')
+        offsets = np.searchsorted(ends[order], np.arange(vertexCount + 1))
+        others = others[order]
+        edgeWeights = edgeWeights[order]
+
+        parent = np.full(vertexCount, -2, dtype=np.int32)
+        length = np.zeros(vertexCount, dtype=weights.dtype if len(weights) > 0 else float)
+        parent[root] = -1
+        queue = [root]
+        for v in queue:
+            neighbors = others[offsets[v]:offsets[v + 1]]
+            new = parent[neighbors] == -2
+            parent[neighbors[new]] = v
+            length[neighbors[new]] = edgeWeights[offsets[v]:offsets[v + 1]][new]
+            queue.extend(neighbors[new].tolist())
+        if len(queue) < vertexCount:
+            print("Error: edge list is not a connected tree; unreached vertices are left as extra roots.")
+            parent[parent == -2] = -1
+        return cls(parent, length, names)
+
+    @classmethod
+    def fromLabels(cls, vertex, parent, length) -> 'Tree':
+        """
+        Builds a tree whose vertices carry arbitrary non-negative labels, e.g. a builder's vertexList.
+
+        Input: vertex, parent, length = label of every vertex, label of its parent (-1 for the root) and length of
+            the edge to it
+        Return: Tree; if the labels are exactly 0, 1, ..., vertexCount-1 they are the vertex numbers, otherwise the
+            vertices are numbered in increasing label order and the labels are kept as names
+        """
+        vertex = np.asarray(vertex, dtype=np.int64)
+        parent = np.asarray(parent, dtype=np.int64)
+        length = np.asarray(length)
+        labels = np.unique(vertex)
+        ordered = np.full(len(labels), -1, dtype=np.int32)
+        orderedLength = np.zeros(len(labels), dtype=length.dtype)
+        hasParent = parent >= 0
+        ordered[np.searchsorted(labels, vertex[hasParent])] = np.searchsorted(labels, parent[hasParent])
+        orderedLength[np.searchsorted(labels, vertex)] = length
+        contiguous = len(labels) == 0 or labels[-1] == len(labels) - 1
+        return cls(ordered, orderedLength, None if contiguous else [str(label) for label in labels.tolist()])
+
+    @classmethod
+    def fromDict(cls, tree: dict, treeWeights: dict, root: int = None) -> 'Tree':
+        """
+        Adapter from the legacy output of the builders.
+
+        Input: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree,
+            root = vertex to root at (default: the smallest vertex)
+        Return: Tree
+        """
+        edges = [(i, j) for i in tree for j in tree[i] if i < j]
+        i = [edge[0] for edge in edges]
+        j = [edge[1] for edge in edges]
+        return cls.fromEdges(i, j, [treeWeights[edge] for edge in edges], min(tree) if root == None else root)
+
+    def toDict(self) -> (dict, dict):
+        """
+        Adapter to the legacy output of the builders: every vertex lists its parent first, then its children.
+        Returns: tree = adjacency list of tree, treeWeights = edgeWeights between vertices in our tree
+        """
+        parent = self.parent.tolist()
+        length = self.length.tolist()
+        tree = {v: [] if parent[v] < 0 else [parent[v]] for v in range(self.vertexCount)}
+        treeWeights = {}
+        for v in range(self.vertexCount):
+            if parent[v] >= 0:
+                tree[parent[v]].append(v)
+                treeWeights[(parent[v], v)] = length[v]
+                treeWeights[(v, parent[v])] = length[v]
+        return tree, treeWeights
+
+    def writeNewick(self, file, chunkSize: int = 1 << 16):
+        """
+        Streams the tree to an open text file in Newick format, labelling every vertex, and ends it with ';'.
+        Labels that Newick would misread are single-quoted.
+        """
+        parent = self.parent
+        length = self.length.tolist()
+        pieces = []
+
+        def label(v):
+            text = self.name(v)
+            if _NEWICK_SPECIAL.search(text):
+                text = "'" + text.replace("'", "''") + "'"
+            return text if parent[v] < 0 else text + ":" + str(length[v])
+
+        # Stack entries: vertex to open, ~vertex to close, None for a comma
+        stack = [self.root]
+        while len(stack) > 0:
+            item = stack.pop()
+            if item is None:
+                pieces.append(",")
+            elif item < 0:
+                pieces.append(")" + label(~item))
+            else:
+                children = self.childrenOf(item).tolist()
+                if len(children) == 0:
+                    pieces.append(label(item))
+                else:
+                    pieces.append("(")
+                    stack.append(~item)
+                    for c in range(len(children) - 1, -1, -1):
+                        stack.append(children[c])
+                        if c > 0:
+                            stack.append(None)
+            if len(pieces) >= chunkSize:
+                file.write("".join(pieces))
+                pieces = []
+        pieces.append(";\n")
+        file.write("".join(pieces))
+
+    @classmethod
+    def readNewick(cls, file, chunkSize: int = 1 << 16) -> 'Tree':
+        """
+        Reads the first tree of an open Newick file in chunks of chunkSize characters. Vertices are numbered in
+        order of appearance; if every vertex is labelled and the labels are exactly 0, 1, ..., vertexCount-1 (as
+        written by writeNewick without names), the labels are used as vertex numbers instead.
+        Return: Tree
+        """
+        parent = []
+        length = []
+        names = []
+        openVertices = []
+        last = -1
+        needVertex = True
+        expectLength = False
+        carry = ""
+        done = False
+
+        def newVertex():
+            parent.append(openVertices[-1] if len(openVertices) > 0 else -1)
+            length.append(0)
+            names.append("")
+            return len(parent) - 1
+
+        while not done:
+            chunk = file.read(chunkSize)
+            buffer = carry + chunk
+            position = 0
+            while not done:
+                match = _NEWICK_TOKEN.match(buffer, position)
+                # The last token of a chunk may be cut off; keep it for the next one. A quoted label followed by
+                # a quote may be cut at an escaped '' and continue in the next chunk too.
+                if match is None or (chunk != "" and (match.end() == len(buffer) or (
+                        match.group(1)[0] == "'" and buffer[match.end()] == "'"))):
+                    break
+                position = match.end()
+                token = match.group(1)
+                if expectLength:
+                    length[last] = int(token) if re.fullmatch(r"[+-]?\d+", token) else float(token)
+                    expectLength = False
+                elif token == "(":
+                    last = newVertex()
+                    openVertices.append(last)
+                    needVertex = True
+                elif token in (",", ")", ";", ":"):
+                    # an empty label: the vertex this token closes has not been created yet
+                    if needVertex and (token != ";" or len(parent) == 0):
+                        last = newVertex()
+                    needVertex = token == ","
+                    if token == ")":
+                        last = openVertices.pop()
+                    elif token == ";":
+                        done = True
+                    elif token == ":":
+                        expectLength = True
+                else:
+                    if needVertex:
+                        last = newVertex()
+                        needVertex = False
+                    names[last] = token[1:-1].replace("''", "'") if token.startswith("'") else token
+            carry = buffer[position:]
+            if chunk == "":
+                break
+
+        parent = np.array(parent, dtype=np.int32)
+        length = np.array(length)
+        if all(name.isdigit() for name in names) and sorted(map(int, names)) == list(range(len(names))):
+            vertex = np.array([int(name) for name in names])
+            parent[parent >= 0] = vertex[parent[parent >= 0]]
+            ordered = np.empty_like(parent)
+            ordered[vertex] = parent
+            orderedLength = np.empty_like(length)
+            orderedLength[vertex] = length
+            return cls(ordered, orderedLength)
+        return cls(parent, length, names)
+
+    def writeEdgeList(self, file):
+        """
+        Writes every edge in both directions as 'i->j:weight' lines sorted by i, then j, the format of
+        printPhylogenyTree.
+        """
+        child = np.flatnonzero(self.parent >= 0)
+        source = np.concatenate([child, self.parent[child]])
+        target = np.concatenate([self.parent[child], child])
+        weight = np.concatenate([self.length[child], self.length[child]])
+        order = np.lexsort((target, source))
+        source = source[order].tolist()
+        target = target[order].tolist()
+        weight = weight[order].tolist()
+        for start in range(0, len(order), 1 << 14):
+            end = min(start + (1 << 14), len(order))
+            file.write("".join(str(source[k]) + "->" + str(target[k]) + ":" + str(weight[k]) + "\n"
+                               for k in range(start, end)))
+
+    @classmethod
+    def readEdgeList(cls, file, root: int = 0) -> 'Tree':
+        """
+        Reads 'i->j:weight' lines (as written by writeEdgeList or printPhylogenyTree) line by line. Each edge may
+        appear in one or both directions.
+        Return: Tree rooted at root
+        """
+        seen = set()
+        i, j, weights = [], [], []
+        for line in file:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            edge, weight = line.split(":")
+            a, b = edge.split("->")
+            a, b = int(a), int(b)
+            if (min(a, b), max(a, b)) in seen:
+                continue
+            seen.add((min(a, b), max(a, b)))
+            i.append(a)
+            j.append(b)
+            weights.append(int(weight) if re.fullmatch(r"[+-]?\d+", weight) else float(weight))
+        return cls.fromEdges(i, j, weights, root)
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from DistanceMatrixBuilder import buildDistanceMatrix, pairAt
+
+SEQUENCES = ["".join("ACGT"[(i * 7 + j * j * 3 + i * j) % 4] for j in range(12 + i % 5)) for i in range(23)]
+
+# Metric calls made in this process, and the call that raises, to simulate a build killed halfway
+calls = {'count': 0, 'failAt': None}
+
+
+def mismatches(s1: str, s2: str) -> float:
+    return sum(a != b for a, b in zip(s1, s2)) + abs(len(s1) - len(s2)) + 0.25
+
+
+def flakyMismatches(s1: str, s2: str) -> float:
+    calls['count'] += 1
+    if calls['count'] == calls['failAt']:
+        raise RuntimeError("killed")
+    return mismatches(s1, s2)
+
+
+def expectedMatrix(sequences: list) -> np.ndarray:
+    return np.array([[0 if i == j else mismatches(s1, s2) for j, s2 in enumerate(sequences)]
+                     for i, s1 in enumerate(sequences)])
+
+
+def testPairOrder():
+    n = 9
+    pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    assert [pairAt(k, n) for k in range(len(pairs))] == pairs
+
+
+def testIndependentOfWorkers():
+    expected = expectedMatrix(SEQUENCES)
+    for workers in (1, 2, 3):
+        for chunkSize in (None, 1, 7):
+            D = buildDistanceMatrix(SEQUENCES, mismatches, workers=workers, chunkSize=chunkSize)
+            assert np.array_equal(D, expected)
+    condensed = buildDistanceMatrix(SEQUENCES, mismatches, workers=2, dtype=np.float32, condensed=True)
+    assert np.array_equal(condensed.dense(), expected.astype(np.float32))
+
+
+def testCheckpointResume(tmp_path):
+    checkpoint = str(tmp_path / "build.npz")
+    pairs = len(SEQUENCES) * (len(SEQUENCES) - 1) // 2
+    calls['count'], calls['failAt'] = 0, 100
+    with pytest.raises(RuntimeError):
+        buildDistanceMatrix(SEQUENCES, flakyMismatches, workers=1, chunkSize=10, checkpoint=checkpoint,
+                            checkpointEvery=3)
+    # Call 100 is in chunk 9 (0-based); the last save was after 9 chunks, so the rerun only computes the rest
+    with np.load(checkpoint) as saved:
+        assert saved['done'].sum() == 9
+    calls['count'], calls['failAt'] = 0, None
+    D = buildDistanceMatrix(SEQUENCES, flakyMismatches, workers=1, checkpoint=checkpoint)
+    assert calls['count'] == pairs - 90
+    assert np.array_equal(D, expectedMatrix(SEQUENCES))
+
+    os.remove(checkpoint)
+    calls['count'], calls['failAt'] = 0, 100
+    with pytest.raises(RuntimeError):
+        buildDistanceMatrix(SEQUENCES, flakyMismatches, workers=1, chunkSize=10, checkpoint=checkpoint,
+                            checkpointEvery=3)
+    # Resuming on several workers gives the same matrix
+    D = buildDistanceMatrix(SEQUENCES, mismatches, workers=3, checkpoint=checkpoint)
+    assert np.array_equal(D, expectedMatrix(SEQUENCES))
+
+
+def testCheckpointMismatch(tmp_path):
+    checkpoint = str(tmp_path / "build.npz")
+    buildDistanceMatrix(SEQUENCES, mismatches, workers=1, chunkSize=10, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        buildDistanceMatrix(SEQUENCES[:-1], mismatches, workers=1, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        buildDistanceMatrix(SEQUENCES, mismatches, workers=1, chunkSize=5, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        buildDistanceMatrix(SEQUENCES, mismatches, workers=1, dtype=np.float32, checkpoint=checkpoint)
@@ -0,0 +1,70 @@
+import io
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Neighbor Joining"), os.path.join(ROOT, "Additive Phylogeny")]
+
+from AdditivePhylogeny import additivePhylogeny
+from NeighborJoining import neighborJoining, rapidNeighborJoining
+from PhylogenyTree import Tree
+
+# Additive matrix of the tree ((0:11,1:2):4,2:6,3:7)
+ADDITIVE = np.array([[0, 13, 21, 22],
+                     [13, 0, 12, 13],
+                     [21, 12, 0, 13],
+                     [22, 13, 13, 0]])
+
+
+def newick(tree: Tree) -> str:
+    file = io.StringIO()
+    tree.writeNewick(file)
+    return file.getvalue()
+
+
+def testFromLabels():
+    tree = Tree.fromLabels([0, 1, 2], [2, 2, -1], [1.0, 2.0, 0.0])
+    assert tree.names is None and tree.parent.tolist() == [2, 2, -1]
+    tree = Tree.fromLabels([10, 30, 20], [20, -1, 30], [1.0, 0.0, 2.0])
+    assert tree.names == ['10', '20', '30']
+    assert tree.parent.tolist() == [1, 2, -1] and tree.length.tolist() == [1.0, 2.0, 0.0]
+
+
+def testBuildersWithLabelGaps():
+    tree, vertexList = neighborJoining(ADDITIVE.copy(), 4, [10, 11, 12, 13], asTree=True)
+    assert newick(tree) == "(12:6.0,13:7.0,(10:11.0,11:2.0)14:4.0)15;\n"
+    assert vertexList == [14, 15]
+    rapid = rapidNeighborJoining(ADDITIVE.copy(), 4, [10, 11, 12, 13], asTree=True)[0]
+    assert newick(rapid) == newick(tree)
+
+    # Inner vertices numbered from 10 leave the labels 4-9 unused
+    tree, newIndexCount = additivePhylogeny(ADDITIVE.copy(), 4, 10, asTree=True)
+    assert newick(tree) == "((1:2,(2:6,3:7)11:4)10:11)0;\n"
+    assert newIndexCount == 12
+    assert newick(additivePhylogeny(ADDITIVE.copy(), 4, 4, asTree=True)[0]) == "((1:2,(2:6,3:7)5:4)4:11)0;\n"
+
+
+def testNewickRoundTripAcrossChunks():
+    text = "('a b':1.5,'c''d':2.0,(e:0.25,'''':3.0)'f,g''':4.0)r;\n"
+    for chunkSize in (1, 2, 3, 4, 5, 8, 13, 1 << 16):
+        tree = Tree.readNewick(io.StringIO(text), chunkSize)
+        assert tree.names == ['r', 'a b', "c'd", "f,g'", 'e', "'"]
+        assert tree.parent.tolist() == [-1, 0, 0, 0, 3, 3]
+        assert tree.length.tolist() == [0.0, 1.5, 2.0, 4.0, 0.25, 3.0]
+        assert newick(tree) == text
+        for writeChunk in (1, 3):
+            file = io.StringIO()
+            tree.writeNewick(file, writeChunk)
+            assert file.getvalue() == text
+
+
+def testNewickUnlabelledRoundTrip():
+    tree, _ = neighborJoining(ADDITIVE.copy(), 4, asTree=True)
+    assert tree.names is None
+    for chunkSize in (1, 2, 7):
+        copy = Tree.readNewick(io.StringIO(newick(tree)), chunkSize)
+        assert copy.names is None
+        assert copy.parent.tolist() == tree.parent.tolist()
+        assert copy.length.tolist() == tree.length.tolist()
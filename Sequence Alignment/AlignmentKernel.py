@@ -0,0 +1,298 @@
+import numpy as np
+from ScoringScheme import ScoringScheme
+
+# Per-mode recurrence rules: (initialize first row with gaps, initialize first column with gaps, clamp cells at 0)
+MODES = {
+    'global': (True, True, False),
+    'local': (False, False, True),
+    'overlap': (False, False, False),
+    'fitting': (True, False, False),
+}
+
+# Traceback move codes, stored 2 bits per cell
+STOP, LEFT, TOP, DIAG = 0, 1, 2, 3
+
+# Above this many DP cells the alignment functions switch to linear space by default (128 MB of int64 scores)
+LINEAR_SPACE_CELLS = 1 << 24
+
+
+def compileScores(s1: str, s2: str, scoreMatrix) -> (np.ndarray, np.ndarray):
+    """ Encodes s1 and builds the substitution profile of s2, so that row i of the DP scores s1[i - 1] against all
+        of s2 with profile[codes1[i - 1]].
+        Input: Two amino acid strings s1, s2. Scoring matrix as a dict of character-pair tuples or a ScoringScheme.
+        Return: codes of s1 and the len(alphabet) x len(s2) profile of s2.
+    """
+    if not isinstance(scoreMatrix, ScoringScheme):
+        checkPairs(set(s1), set(s2), scoreMatrix)
+        scoreMatrix = ScoringScheme.fromDict(scoreMatrix)
+    return scoreMatrix.encode(s1), scoreMatrix.profile(s2)
+
+
+def checkPairs(chars1: set, chars2: set, scoreMatrix: dict):
+    """ Legacy dict matrices: every pair in chars1 x chars2 gets scored, so fail the way a per-cell lookup would
+        instead of letting ScoringScheme.fromDict score a missing pair as 0.
+    """
+    for a in chars1:
+        for b in chars2:
+            if (a, b) not in scoreMatrix and (b, a) not in scoreMatrix:
+                raise KeyError((b, a))
+
+
+def fillRow(prev: np.ndarray, curr: np.ndarray, subRow: np.ndarray, indelPenalty: int, gapRamp: np.ndarray,
+            clamp: bool):
+    """ Computes one row of the alignment recurrence as whole-array operations. curr[0] must already hold the
+        row's initial value. Diagonal and vertical moves are elementwise; horizontal moves are resolved with a prefix
+        max, since curr[j] = max over k <= j of (cand[k] + (j - k) * indelPenalty).
+        Input: previous row, row to fill, substitution scores against s2 for this row, indel penalty,
+            gapRamp = arange(len(curr)) * indelPenalty, whether to clamp cells at 0 (local alignment).
+    """
+    body = curr[1:]
+    np.add(prev[:-1], subRow, out=body)
+    np.maximum(body, prev[1:] + indelPenalty, out=body)
+    if clamp:
+        np.maximum(body, 0, out=body)
+    curr -= gapRamp
+    np.maximum.accumulate(curr, out=curr)
+    curr += gapRamp
+
+
+def fillPointers(codes1: np.ndarray, profile: np.ndarray, indelPenalty: int, mode: str,
+                 keepPointers: bool = True) -> (np.ndarray, int, int, int, int):
+    """ Fills the alignment matrix one row at a time, keeping only two score rows. Each cell's traceback move is
+        stored as a 2-bit code (STOP, LEFT, TOP, DIAG), packed four cells per byte, so the pointer matrix is 32x
+        smaller than an int64 score matrix. Moves follow the traceback order left, top, diagonal; local cells
+        scoring 0 are STOP.
+        Input: encoded s1, profile of s2 (see compileScores), indel penalty, alignment mode (see MODES), and
+            whether to keep the pointers (False for a score-only pass).
+        Return: packed (len(s1)+1) x ceil((len(s2)+1)/4) pointer matrix (None if not kept), max score, its row and
+            column, number of cells achieving the max score.
+    """
+    initRow, initCol, clamp = MODES[mode]
+    rows = len(codes1) + 1
+    cols = profile.shape[1] + 1
+    gapRamp = np.arange(cols, dtype=np.int64) * indelPenalty
+    prev = gapRamp.copy() if initRow else np.zeros(cols, dtype=np.int64)
+    curr = np.empty(cols, dtype=np.int64)
+    lastCol = np.empty(rows, dtype=np.int64)
+    lastCol[0] = prev[-1]
+
+    pointers = None
+    moves = np.zeros((cols + 3) // 4 * 4, dtype=np.uint8)
+    if keepPointers:
+        pointers = np.zeros([rows, (cols + 3) // 4], dtype=np.uint8)
+        if initRow:
+            moves[1:cols] = LEFT
+            pointers[0] = packMoves(moves)
+
+    trackLocal = mode == 'local' and rows > 1 and cols > 1
+    maxScore, maxScoreRow, maxScoreCol, numOptimal = -1, -1, -1, 0
+    for i in range(1, rows):
+        curr[0] = i * indelPenalty if initCol else 0
+        subRow = profile[codes1[i - 1]]
+        fillRow(prev, curr, subRow, indelPenalty, gapRamp, clamp)
+        body = curr[1:]
+        if keepPointers:
+            moves[0] = TOP if initCol else STOP
+            moves[1:cols] = np.where(body == curr[:-1] + indelPenalty, LEFT,
+                                     np.where(body == prev[1:] + indelPenalty, TOP,
+                                              np.where(body == prev[:-1] + subRow, DIAG, STOP)))
+            if clamp:
+                moves[:cols][curr <= 0] = STOP
+            pointers[i] = packMoves(moves)
+        if trackLocal:
+            j = int(np.argmax(body))
+            if body[j] > maxScore:
+                maxScore, maxScoreRow, maxScoreCol = body[j], i, j + 1
+                numOptimal = 0
+            if body[j] == maxScore:
+                numOptimal += int(np.count_nonzero(body == maxScore))
+        lastCol[i] = curr[-1]
+        prev, curr = curr, prev
+
+    if not trackLocal:
+        maxScore, maxScoreRow, maxScoreCol, numOptimal = findEndCell(lastCol, prev, mode)
+    return pointers, maxScore, maxScoreRow, maxScoreCol, numOptimal
+
+
+def packMoves(moves: np.ndarray) -> np.ndarray:
+    """ Packs 2-bit move codes (length a multiple of 4) four to a byte, lowest bits first. """
+    quads = moves.reshape(-1, 4)
+    return quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+
+
+def lastScoreRow(codes1: np.ndarray, profile: np.ndarray, indelPenalty: int, mode: str) -> np.ndarray:
+    """ Score-only pass keeping two rows in memory.
+        Input: encoded s1, profile of s2 (see compileScores), indel penalty and alignment mode (see MODES).
+        Return: last row of the score matrix.
+    """
+    initRow, initCol, clamp = MODES[mode]
+    cols = profile.shape[1] + 1
+    gapRamp = np.arange(cols, dtype=np.int64) * indelPenalty
+    prev = gapRamp.copy() if initRow else np.zeros(cols, dtype=np.int64)
+    curr = np.empty(cols, dtype=np.int64)
+    for i in range(1, len(codes1) + 1):
+        curr[0] = i * indelPenalty if initCol else 0
+        fillRow(prev, curr, profile[codes1[i - 1]], indelPenalty, gapRamp, clamp)
+        prev, curr = curr, prev
+    return prev
+
+
+def findEndCell(lastCol: np.ndarray, lastRow: np.ndarray, mode: str) -> (int, int, int, int):
+    """ Finds the cell a global, overlap or fitting alignment ends in. Ties go to the lowest row of the last
+        column; overlap alignments prefer the last column unless the last row holds a strictly larger score.
+        Input: last column and last row of the score matrix, alignment mode.
+        Return: max score, its row and column, number of cells achieving the max score.
+    """
+    rows = len(lastCol)
+    cols = len(lastRow)
+    if mode in ('global', 'local') or rows == 1 or cols == 1:
+        return lastRow[cols - 1], rows - 1, cols - 1, 1
+
+    lastCol = lastCol[1:]
+    i = int(np.argmax(lastCol))
+    maxScore, maxScoreRow, maxScoreCol = lastCol[i], i + 1, cols - 1
+    if mode == 'overlap':
+        lastRow = lastRow[1:]
+        j = int(np.argmax(lastRow))
+        if lastRow[j] > maxScore:
+            maxScore, maxScoreRow, maxScoreCol = lastRow[j], rows - 1, j + 1
+        numOptimal = np.count_nonzero(lastCol == maxScore) + np.count_nonzero(lastRow == maxScore)
+    else:
+        numOptimal = np.count_nonzero(lastCol == maxScore)
+    return maxScore, maxScoreRow, maxScoreCol, int(numOptimal)
+
+
+def traceback(pointers: np.ndarray, s1: str, s2: str, i: int, j: int, mode: str) -> (str, str):
+    """ Follows the packed moves back from cell (i, j) to recover an alignment. Global alignments stop at the
+        origin, local alignments at the first STOP cell, overlap and fitting alignments when they reach the first
+        row or column. The aligned strings are built in reverse and flipped once.
+        Input: packed pointer matrix (see fillPointers), the strings, end cell and alignment mode.
+        Return: aligned s1 and aligned s2.
+    """
+    v = []
+    w = []
+    while True:
+        if mode == 'global':
+            if i == 0 and j == 0:
+                break
+        elif mode != 'local' and (i == 0 or j == 0):
+            break
+        move = (int(pointers[i][j >> 2]) >> ((j & 3) << 1)) & 3
+        if move == LEFT:
+            v.append('-')
+            w.append(s2[j - 1])
+            j = j - 1
+        elif move == TOP:
+            v.append(s1[i - 1])
+            w.append('-')
+            i = i - 1
+        elif move == DIAG:
+            v.append(s1[i - 1])
+            w.append(s2[j - 1])
+            i = i - 1
+            j = j - 1
+        elif mode == 'local':
+            break
+        else:
+            print("Error in generating sequence alignment")
+            print("i = " + str(i) + ", j = " + str(j))
+            break
+    return ''.join(reversed(v)), ''.join(reversed(w))
+
+
+def align(s1: str, s2: str, scoreMatrix, indelPenalty: int, mode: str) -> (int, int, str, str):
+    """ Shared driver behind globalAlignment, localAlignment, overlapAlignment and fittingAlignment.
+        Input: Two amino acid strings s1, s2. Scoring matrix (dict or ScoringScheme), indel penalty and alignment
+            mode (see MODES).
+        Return: The maximum alignment score, the number of optimal end cells and an alignment achieving the score.
+    """
+    codes1, profile = compileScores(s1, s2, scoreMatrix)
+    pointers, maxScore, i, j, numOptimal = fillPointers(codes1, profile, indelPenalty, mode)
+    v, w = traceback(pointers, s1, s2, i, j, mode)
+    return maxScore, numOptimal, v, w
+
+
+def hirschberg(s1: str, s2: str, codes1: np.ndarray, profile: np.ndarray, indelPenalty: int,
+               baseCells: int = 1 << 16) -> (int, str, str):
+    """ Linear-space global alignment (Hirschberg). Splits s1 at its middle row, finds the column where an optimal
+        path crosses it from a forward score-only pass over the top half and a reverse pass over the bottom half,
+        and recurses on the two sub-rectangles. Sub-rectangles of at most baseCells cells are aligned with the full
+        matrix, so memory stays O(len(s1) + len(s2) + baseCells).
+        Input: the strings, encoded s1, profile of s2 (see compileScores), indel penalty, base case size.
+        Return: The maximum global alignment score followed by an alignment achieving this maximum score.
+    """
+    vParts = []
+    wParts = []
+    maxScore = None
+    # Explicit stack of sub-rectangles (i0, i1, j0, j1), pushed right half first so pieces come out in order
+    stack = [(0, len(s1), 0, len(s2))]
+    while stack:
+        i0, i1, j0, j1 = stack.pop()
+        if (i1 - i0 + 1) * (j1 - j0 + 1) <= baseCells or i1 - i0 < 2:
+            pointers, score, i, j, numOptimal = fillPointers(codes1[i0:i1], profile[:, j0:j1], indelPenalty, 'global')
+            v, w = traceback(pointers, s1[i0:i1], s2[j0:j1], i, j, 'global')
+            if maxScore is None:
+                maxScore = score
+            vParts.append(v)
+            wParts.append(w)
+            continue
+
+        mid = (i0 + i1) // 2
+        forward = lastScoreRow(codes1[i0:mid], profile[:, j0:j1], indelPenalty, 'global')
+        reverse = lastScoreRow(codes1[mid:i1][::-1], profile[:, j0:j1][:, ::-1], indelPenalty, 'global')
+        total = forward + reverse[::-1]
+        jMid = j0 + int(np.argmax(total))
+        if maxScore is None:
+            maxScore = total[jMid - j0]
+        stack.append((mid, i1, jMid, j1))
+        stack.append((i0, mid, j0, jMid))
+
+    return maxScore, ''.join(vParts), ''.join(wParts)
+
+
+def localEndCell(codes1: np.ndarray, profile: np.ndarray, indelPenalty: int) -> (int, int, int, int):
+    """ Score-only local alignment pass keeping two rows in memory. Ties go to the first cell in row-major order.
+        Input: encoded s1, profile of s2 (see compileScores) and indel penalty.
+        Return: max score, its row and column, number of cells achieving the max score.
+    """
+    return fillPointers(codes1, profile, indelPenalty, 'local', keepPointers=False)[1:]
+
+
+def localStartCell(codes1: np.ndarray, profile: np.ndarray, indelPenalty: int, i: int, j: int,
+                   maxScore: int) -> (int, int):
+    """ Finds where a local alignment ending in cell (i, j) with score maxScore starts. Runs a global score-only
+        pass over the reversed prefixes s1[:i] and s2[:j], whose cell (a, b) is the score of aligning s1[i-a:i]
+        with s2[j-b:j], and stops at the first row reaching maxScore.
+        Input: encoded s1, profile of s2, indel penalty, end cell and score of the local alignment.
+        Return: start row and column, so that the alignment spans s1[start row:i] and s2[start column:j].
+    """
+    if maxScore <= 0:
+        return i, j
+
+    reversedCodes = codes1[:i][::-1]
+    reversedProfile = profile[:, :j][:, ::-1]
+    gapRamp = np.arange(j + 1, dtype=np.int64) * indelPenalty
+    prev = gapRamp.copy()
+    curr = np.empty(j + 1, dtype=np.int64)
+    for a in range(1, i + 1):
+        curr[0] = a * indelPenalty
+        fillRow(prev, curr, reversedProfile[reversedCodes[a - 1]], indelPenalty, gapRamp, False)
+        hits = np.flatnonzero(curr == maxScore)
+        if len(hits):
+            return i - a, j - int(hits[0])
+        prev, curr = curr, prev
+    print("Error in locating start of local alignment")
+    return 0, 0
+
+
+def linearSpaceLocal(s1: str, s2: str, codes1: np.ndarray, profile: np.ndarray,
+                     indelPenalty: int) -> (int, int, str, str):
+    """ Linear-space local alignment: a forward pass finds the best score and end cell, a reverse pass from that
+        cell finds the start, and only the bounded sub-rectangle is aligned with Hirschberg.
+        Input: the strings, encoded s1, profile of s2 (see compileScores) and indel penalty.
+        Return: The maximum local alignment score, the number of optimal end cells and an alignment achieving it.
+    """
+    maxScore, i, j, numOptimal = localEndCell(codes1, profile, indelPenalty)
+    iStart, jStart = localStartCell(codes1, profile, indelPenalty, i, j, maxScore)
+    score, v, w = hirschberg(s1[iStart:i], s2[jStart:j], codes1[iStart:i], profile[:, jStart:j], indelPenalty)
+    return maxScore, numOptimal, v, w
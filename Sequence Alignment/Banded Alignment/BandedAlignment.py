@@ -0,0 +1,170 @@
+import os
+import sys
+import numpy as np
+
+# The shared alignment kernel and scoring scheme live in the parent folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from AlignmentKernel import compileScores
+from ScoringScheme import ScoringScheme
+
+# Score of cells outside the band; low enough to never win, high enough to never overflow
+UNREACHABLE = -(1 << 40)
+
+
+def bandedAlignment(s1: str, s2: str, scoreMatrix: {dict, ScoringScheme}, indelPenalty: int, band: int = None,
+                    mode: str = 'global', xDrop: int = None, diagonal: int = 0) -> {int, str, str, bool}:
+    """ Global or overlap alignment restricted to a band of diagonals, for near-identical sequences. Row i only
+        computes the columns within band of the band centre: the line from (0, 0) to (len(s1), len(s2)) for global
+        alignment, the diagonal j = i + diagonal for overlap alignment. With xDrop, each row is further trimmed to
+        the cells scoring at least (best score so far - xDrop), so the band follows the alignment adaptively.
+        Fill and traceback are O(len(s1) * band).
+        Input: Two amino acid strings s1, s2. Scoring matrix (dict or ScoringScheme) and indel penalty.
+            band = half-width of the band (None for no fixed band, then xDrop should be given),
+            mode = 'global' or 'overlap', xDrop = X-drop threshold, diagonal = band centre for overlap alignment.
+        Return: The maximum alignment score (None if X-drop never reached the end cell) followed by an alignment
+            achieving it, and whether the alignment touched the band edge; if it did, a wider band may score higher.
+    """
+    if mode not in ('global', 'overlap'):
+        print("Error: banded alignment supports 'global' and 'overlap' modes only.")
+        return None, "", "", True
+
+    codes1, profile = compileScores(s1, s2, scoreMatrix)
+    rows, bounds = fillBand(codes1, profile, indelPenalty, mode, band, xDrop, diagonal)
+    n, m = len(s1), len(s2)
+
+    # Find end cell: (n, m) for global; best cell of the last column, then of the last row, for overlap
+    maxScore, endRow, endCol = UNREACHABLE, n, m
+    if mode == 'global':
+        maxScore = cellScore(rows, bounds, n, m)
+    else:
+        for i in range(1, n + 1):
+            score = cellScore(rows, bounds, i, m)
+            if score > maxScore:
+                maxScore, endRow, endCol = score, i, m
+        lo = max(bounds[n][0], 1)
+        if bounds[n][1] >= lo:
+            lastRow = rows[n][lo - bounds[n][0]:]
+            j = int(np.argmax(lastRow))
+            if lastRow[j] > maxScore:
+                maxScore, endRow, endCol = lastRow[j], n, lo + j
+    if maxScore <= UNREACHABLE // 2:
+        return None, "", "", True
+
+    v, w, bandHit = bandedTraceback(rows, bounds, s1, s2, codes1, profile, indelPenalty, endRow, endCol, mode)
+    return maxScore, v, w, bandHit
+
+
+def fillBand(codes1: np.ndarray, profile: np.ndarray, indelPenalty: int, mode: str, band: int, xDrop: int,
+             diagonal: int) -> (list, list):
+    """ Fills the banded score matrix row by row with the same prefix-max row recurrence as the full kernel.
+        Input: encoded s1, profile of s2 (see compileScores), indel penalty, mode, band half-width, X-drop
+            threshold and band centre diagonal for overlap alignment.
+        Return: list of score rows and list of their (first column, last column); cells the band or X-drop left
+            out score UNREACHABLE.
+    """
+    n = len(codes1)
+    m = profile.shape[1]
+    initGaps = mode == 'global'
+
+    def bandBounds(i):
+        if band is None:
+            return 0, m
+        centre = (i * m + n // 2) // n if initGaps and n > 0 else i + diagonal
+        return max(0, centre - band), min(m, centre + band)
+
+    # X-drop lets a live cell extend at most this many columns to the right with gaps
+    reach = m if xDrop is None else xDrop // max(-indelPenalty, 1) + 1
+    best = 0
+
+    lo, hi = bandBounds(0)
+    row = np.arange(lo, hi + 1, dtype=np.int64) * indelPenalty if initGaps else np.zeros(hi - lo + 1, np.int64)
+    rows, bounds = [row], [(lo, hi)]
+    if xDrop is not None:
+        best = row.max()
+        row[row < best - xDrop] = UNREACHABLE
+
+    for i in range(1, n + 1):
+        prev = rows[-1]
+        prevLo, prevHi = bounds[-1]
+        lo, hi = bandBounds(i)
+        if xDrop is not None:
+            live = np.flatnonzero(prev > UNREACHABLE // 2)
+            if len(live) == 0:
+                lo, hi = 1, 0
+            else:
+                lo = max(lo, prevLo + int(live[0]))
+                hi = min(hi, prevLo + int(live[-1]) + reach)
+        if lo > hi:
+            rows.append(np.zeros(0, dtype=np.int64))
+            bounds.append((lo, hi))
+            continue
+
+        # Previous row over columns lo-1 .. hi, padded with UNREACHABLE outside its own bounds
+        padded = np.full(hi - lo + 2, UNREACHABLE, dtype=np.int64)
+        a, b = max(prevLo, lo - 1), min(prevHi, hi)
+        if a <= b:
+            padded[a - (lo - 1):b - (lo - 1) + 1] = prev[a - prevLo:b - prevLo + 1]
+
+        curr = np.empty(hi - lo + 1, dtype=np.int64)
+        start = 0
+        if lo == 0:
+            curr[0] = i * indelPenalty if initGaps else 0
+            start = 1
+        cols = np.arange(lo + start, hi + 1)
+        np.add(padded[start:-1], profile[codes1[i - 1], cols - 1], out=curr[start:])
+        np.maximum(curr[start:], padded[start + 1:] + indelPenalty, out=curr[start:])
+        gapRamp = np.arange(len(curr), dtype=np.int64) * indelPenalty
+        curr -= gapRamp
+        np.maximum.accumulate(curr, out=curr)
+        curr += gapRamp
+        np.maximum(curr, UNREACHABLE, out=curr)
+
+        if xDrop is not None:
+            best = max(best, curr.max())
+            curr[curr < best - xDrop] = UNREACHABLE
+        rows.append(curr)
+        bounds.append((lo, hi))
+    return rows, bounds
+
+
+def cellScore(rows: list, bounds: list, i: int, j: int) -> int:
+    lo, hi = bounds[i]
+    if j < lo or j > hi:
+        return UNREACHABLE
+    return rows[i][j - lo]
+
+
+def bandedTraceback(rows: list, bounds: list, s1: str, s2: str, codes1: np.ndarray, profile: np.ndarray,
+                    indelPenalty: int, i: int, j: int, mode: str) -> (str, str, bool):
+    """ Walks back from cell (i, j) trying left, top and diagonal moves in that order, like the full traceback.
+        Return: aligned s1, aligned s2 and whether the path touched a band edge that is not a matrix edge.
+    """
+    m = len(s2)
+    v = []
+    w = []
+    bandHit = False
+    while (i > 0 or j > 0) if mode == 'global' else (i > 0 and j > 0):
+        lo, hi = bounds[i]
+        if (j == lo and lo > 0) or (j == hi and hi < m):
+            bandHit = True
+        curr = cellScore(rows, bounds, i, j)
+        if j > 0 and curr == cellScore(rows, bounds, i, j - 1) + indelPenalty:
+            v.append('-')
+            w.append(s2[j - 1])
+            j = j - 1
+        elif i > 0 and curr == cellScore(rows, bounds, i - 1, j) + indelPenalty:
+            v.append(s1[i - 1])
+            w.append('-')
+            i = i - 1
+        elif i > 0 and j > 0 and curr == cellScore(rows, bounds, i - 1, j - 1) + profile[codes1[i - 1]][j - 1]:
+            v.append(s1[i - 1])
+            w.append(s2[j - 1])
+            i = i - 1
+            j = j - 1
+        else:
+            print("Error in generating sequence alignment")
+            print("i = " + str(i) + ", j = " + str(j))
+            break
+    return ''.join(reversed(v)), ''.join(reversed(w)), bandHit
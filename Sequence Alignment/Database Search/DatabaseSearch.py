@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import numpy as np
+
+# The shared alignment kernel and scoring scheme live in the parent folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from AlignmentKernel import LINEAR_SPACE_CELLS, MODES, checkPairs, fillPointers, hirschberg, localEndCell, \
+    localStartCell, traceback
+from ScoringScheme import ScoringScheme
+
+
+def search(query: str, database: list, scoreMatrix: {dict, ScoringScheme}, indelPenalty: int, mode: str = 'local',
+           topN: int = 10, batchSize: int = 256) -> (list, np.ndarray, dict):
+    """ Aligns one query against many target sequences. Targets are sorted by length and packed into buckets of up
+        to batchSize sequences, and each bucket runs the score-only DP for all of its targets at once: row i of the
+        DP is a (targets x query length) array operation. Only the topN best-scoring targets are re-aligned with a
+        traceback.
+        Input: query string, list of target strings, scoring matrix (dict or ScoringScheme), indel penalty,
+            mode = 'local', 'global', 'overlap' or 'fitting' (query fitted into each target), number of hits to
+            align and bucket size.
+        Return: ranked list of hits, the score of every target in database order, and throughput stats.
+            Each hit is a dict with the target index, score, targetStart/targetEnd and queryStart/queryEnd
+            (half-open) and the aligned target and query strings.
+    """
+    if not isinstance(scoreMatrix, ScoringScheme):
+        checkPairs(set().union(*database), set(query), scoreMatrix)
+        scoreMatrix = ScoringScheme.fromDict(scoreMatrix)
+    start = time.perf_counter()
+    profile = scoreMatrix.profile(query)
+    lengths = np.array([len(target) for target in database], dtype=np.int64)
+    scores = np.zeros(len(database), dtype=np.int64)
+
+    order = np.argsort(lengths, kind='stable')
+    for b in range(0, len(order), batchSize):
+        bucket = order[b:b + batchSize]
+        codes = np.zeros([len(bucket), lengths[bucket].max()], dtype=np.intp)
+        for row, t in enumerate(bucket):
+            codes[row, :lengths[t]] = scoreMatrix.encode(database[t])
+        scores[bucket] = batchScores(codes, lengths[bucket], profile, indelPenalty, mode)
+    scoreSeconds = time.perf_counter() - start
+
+    # Rank by score, ties broken by database order
+    ranked = np.lexsort((np.arange(len(database)), -scores))[:topN]
+    hits = [alignHit(int(t), database[t], query, scoreMatrix, profile, indelPenalty, mode) for t in ranked]
+
+    cells = int(lengths.sum()) * len(query)
+    stats = {
+        'targets': len(database),
+        'cells': cells,
+        'scoreSeconds': scoreSeconds,
+        'totalSeconds': time.perf_counter() - start,
+        'cellsPerSecond': cells / scoreSeconds if scoreSeconds > 0 else float('inf'),
+    }
+    return hits, scores, stats
+
+
+def batchScores(codes: np.ndarray, lengths: np.ndarray, profile: np.ndarray, indelPenalty: int,
+                mode: str) -> np.ndarray:
+    """ Score-only DP for a batch of targets (rows of codes, padded past their lengths) against one query profile.
+        Uses the same prefix-max row recurrence as fillRow, along axis 1 of a (targets x query length) state.
+        Return: alignment score of every target under the given mode.
+    """
+    initRow, initCol, clamp = MODES[mode]
+    count, maxLength = codes.shape
+    cols = profile.shape[1] + 1
+    # Scores are bounded by (path length) x (largest step), so most batches fit int32 and move half the memory
+    bound = (maxLength + cols) * max(int(np.abs(profile).max(initial=0)), abs(indelPenalty))
+    dtype = np.int32 if bound < np.iinfo(np.int32).max else np.int64
+    gapRamp = np.arange(cols, dtype=dtype) * indelPenalty
+    prev = np.tile(gapRamp, (count, 1)) if initRow else np.zeros([count, cols], dtype=dtype)
+    curr = np.empty([count, cols], dtype=dtype)
+
+    # Mode end rules: best cell anywhere (local), last cell of last row (global), best cell of last column
+    # (fitting), or best of both last column and last row (overlap)
+    if mode == 'global':
+        best = prev[:, -1].astype(np.int64)
+    elif mode == 'local':
+        best = np.zeros(count, dtype=np.int64)
+    else:
+        best = np.full(count, np.iinfo(np.int64).min)
+
+    for i in range(1, maxLength + 1):
+        curr[:, 0] = i * indelPenalty if initCol else 0
+        body = curr[:, 1:]
+        np.add(prev[:, :-1], profile[codes[:, i - 1]], out=body)
+        np.maximum(body, prev[:, 1:] + indelPenalty, out=body)
+        if clamp:
+            np.maximum(body, 0, out=body)
+        curr -= gapRamp
+        np.maximum.accumulate(curr, axis=1, out=curr)
+        curr += gapRamp
+
+        active = lengths >= i
+        if mode == 'local':
+            np.maximum(best, np.where(active, body.max(axis=1, initial=0), 0), out=best)
+        elif mode == 'global':
+            last = lengths == i
+            best[last] = curr[last, -1]
+        else:
+            if cols > 1:
+                np.maximum(best, np.where(active, curr[:, -1], best), out=best)
+            if mode == 'overlap' and cols > 1:
+                last = lengths == i
+                best[last] = np.maximum(best[last], body[last].max(axis=1))
+        prev, curr = curr, prev
+
+    if mode in ('overlap', 'fitting'):
+        # Degenerate matrices end in their last cell, like findEndCell
+        best[lengths == 0] = gapRamp[-1] if initRow else 0
+        if cols == 1:
+            best[:] = 0
+    return best
+
+
+def alignHit(index: int, target: str, query: str, scheme: ScoringScheme, profile: np.ndarray, indelPenalty: int,
+             mode: str) -> dict:
+    """ Full alignment of one hit, in linear space when the DP matrix would exceed LINEAR_SPACE_CELLS. """
+    codes = scheme.encode(target)
+    if (len(target) + 1) * (len(query) + 1) > LINEAR_SPACE_CELLS and mode in ('local', 'global'):
+        if mode == 'local':
+            score, i, j, numOptimal = localEndCell(codes, profile, indelPenalty)
+            i0, j0 = localStartCell(codes, profile, indelPenalty, i, j, score)
+            s, v, w = hirschberg(target[i0:i], query[j0:j], codes[i0:i], profile[:, j0:j], indelPenalty)
+        else:
+            score, v, w = hirschberg(target, query, codes, profile, indelPenalty)
+            i, j = len(target), len(query)
+    else:
+        pointers, score, i, j, numOptimal = fillPointers(codes, profile, indelPenalty, mode)
+        v, w = traceback(pointers, target, query, i, j, mode)
+    return {
+        'target': index,
+        'score': int(score),
+        'targetStart': i - (len(v) - v.count('-')),
+        'targetEnd': i,
+        'queryStart': j - (len(w) - w.count('-')),
+        'queryEnd': j,
+        'targetAlignment': v,
+        'queryAlignment': w,
+    }
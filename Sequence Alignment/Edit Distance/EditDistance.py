@@ -1,37 +1,115 @@
-import numpy as np
+# With maxK, patterns at least this long (64 machine words) whose band is at most a quarter of the pattern take
+# the banded path; below that the extra per-column work of sliding the band costs more than the narrower words save
+BANDED_MIN_LENGTH = 4096
 
 
-def editDistance(s1: str, s2: str) -> {int}:
+def editDistance(s1: str, s2: str, maxK: int = None) -> {int}:
     """ The edit distance is the minimum number of edit operations needed to transform s1 into s2, where operation is
         defined as substitution, insertion, or deletion of a single symbol.
-        Input: Two amino acid strings s1, s2.
-        Return: The maximum alignment score of these strings followed by an alignment achieving this maximum score.
+        Implemented with Myers' bit-vector algorithm (Hyyro's formulation for edit distance), using Python ints
+        as arbitrarily wide machine words: each column of the DP matrix is updated with a constant number of
+        word operations.
+        With maxK, long patterns only compute the 2 * maxK + 1 diagonals around the main one (Ukkonen's cutoff),
+        since an alignment of cost <= maxK never leaves them, so a column costs O(maxK) bits instead of O(len(s1)).
+        Input: Two amino acid strings s1, s2. Optional maxK: the largest distance of interest.
+        Return: The edit distance between s1 and s2, or -1 if it exceeds maxK (the alignment leaves the band).
     """
+    # The shorter string is the pattern, so the bit vectors stay as narrow as possible
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    m = len(s1)
+    n = len(s2)
+    if maxK is not None and n - m > maxK:
+        return -1
+    if m == 0:
+        return n
+    if maxK is not None and m >= BANDED_MIN_LENGTH and 4 * (2 * maxK + 1) <= m:
+        return bandedDistance(s1, s2, maxK)
 
-    # Initialize score matrix
-    rows = len(s1) + 1
-    cols = len(s2) + 1
-    matrix = np.zeros([rows, cols], dtype=int)
-    penalty = 1
-    for i in range(rows):
-        matrix[i][0] = i * penalty
-    for j in range(cols):
-        matrix[0][j] = j * penalty
-
-    # Compute Edit Distance Matrix
-    for i in range(1, rows):
-        for j in range(1, cols):
-            # check insertion score
-            score1 = matrix[i - 1][j] + penalty
-            # check match/mismatch score
-            if s1[i - 1] == s2[j - 1]:
-                score2 = matrix[i-1][j-1]
-            else:
-                score2 = matrix[i-1][j-1] + 1
-            # check deletion score
-            score3 = matrix[i][j - 1] + penalty
-
-            matrix[i][j] = min(min(score1, score2), score3)
-
-    dist = matrix[rows - 1][cols - 1]
-    return dist
+    # peq[c] has bit i set where s1[i] == c
+    peq = {}
+    for i, c in enumerate(s1):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    mask = (1 << m) - 1
+    highBit = 1 << (m - 1)
+
+    # Vertical deltas of the current column: pv/mv bit i set when D[i+1][j] - D[i][j] is +1/-1
+    pv = mask
+    mv = 0
+    dist = m
+    for j, c in enumerate(s2):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & highBit:
+            dist += 1
+        elif mh & highBit:
+            dist -= 1
+        # the first row is D[0][j] = j, so every column shifts in a horizontal +1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        # each remaining column can lower the distance by at most one
+        if maxK is not None and dist - (n - j - 1) > maxK:
+            return -1
+
+    return dist if maxK is None or dist <= maxK else -1
+
+
+def bandedDistance(s1: str, s2: str, maxK: int) -> int:
+    """ editDistance restricted to the rows lo..hi of each column j with |i - j| <= maxK, for len(s1) <= len(s2)
+        <= len(s1) + maxK. The window slides down one row per column: the row shifted out on top becomes the cell
+        above the window, assumed to grow by one per column, and a row shifted in at the bottom is assumed to be one
+        more than the row above it. Both assumptions only overestimate cells outside the band, so every cell in the
+        band whose distance is <= maxK comes out exact.
+        Return: The edit distance between s1 and s2, or -1 if it exceeds maxK.
+    """
+    m = len(s1)
+    n = len(s2)
+    width = 2 * maxK + 1
+    # blocks[q][c] has bit b set where s1[q * stride + b] == c, so any window of the pattern bits is one shift away
+    stride = max(64, width)
+    alphabet = set(s1)
+    blocks = []
+    for q in range(0, m, stride):
+        segment = s1[q:q + stride + width][::-1]
+        blocks.append({c: int(segment.translate(str.maketrans({a: '1' if a == c else '0' for a in alphabet})), 2)
+                       for c in alphabet})
+
+    # The window holds the vertical deltas of rows lo..hi; top is the value of row lo - 1 in the current column
+    lo, hi = 1, min(m, maxK)
+    pv = (1 << hi) - 1
+    mv = 0
+    top = 0
+    for j, c in enumerate(s2, 1):
+        if j - maxK > lo:
+            top += (pv & 1) - (mv & 1)
+            pv >>= 1
+            mv >>= 1
+            lo += 1
+        if j + maxK > hi < m:
+            pv |= 1 << (hi + 1 - lo)
+            hi += 1
+        mask = (1 << (hi - lo + 1)) - 1
+        eq = (blocks[(lo - 1) // stride].get(c, 0) >> ((lo - 1) % stride)) & mask
+
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        top += 1
+
+        # Every width columns: stop once every cell of the band exceeds maxK. No row is below top minus the number
+        # of -1 deltas, and an alignment within maxK crosses this column inside the band
+        if j % width == 0 and top - bin(mv).count('1') > maxK:
+            return -1
+
+    dist = top + bin(pv).count('1') - bin(mv).count('1')
+    return dist if dist <= maxK else -1
@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Global Alignment")]
+
+from GlobalAlignment import globalAlignment
+
+UNIT = {(a, b): (1 if a == b else -1) for a in 'ACGT' for b in 'ACGT'}
+WIDE = {(a, b): (3 if a == b else -2) for a in 'ACGT' for b in 'ACGT'}
+
+
+def alignmentScore(v: str, w: str, scoreMatrix: dict, indelPenalty: int) -> int:
+    return sum(indelPenalty if a == '-' or b == '-' else scoreMatrix[(a, b)] for a, b in zip(v, w))
+
+
+def testMatchesBaselineOutput():
+    # Outputs of the original cell-by-cell implementation, whose traceback never reached the border on these
+    cases = [
+        ('GATTACA', 'GCATGCT', UNIT, -2, (-1, 'GATTACA', 'GCATGCT')),
+        ('ACGTACGT', 'ACGACGT', UNIT, -1, (6, 'ACGTACGT', 'ACG-ACGT')),
+        ('TTAGGC', 'TAGGCA', WIDE, -4, (7, 'TTAGGC-', 'T-AGGCA')),
+        ('AAAA', 'AAAA', UNIT, -1, (4, 'AAAA', 'AAAA')),
+        ('GGATCGA', 'GAATTCAGTTA', WIDE, -3, (4, 'GGAT-C-G--A', 'GAATTCAGTTA')),
+        ('ACACACTA', 'AGCACACA', UNIT, -1, (5, 'A-CACACTA', 'AGCACAC-A')),
+    ]
+    for s1, s2, scoreMatrix, indelPenalty, expected in cases:
+        assert globalAlignment(s1, s2, scoreMatrix, indelPenalty, linearSpace=False) == expected
+
+
+def testBorderTraceback():
+    # Once the traceback reached column 0, the original implementation compared against matrix[i][-1], the last
+    # column, and could step left off the matrix: it returned '--AAAA' / 'CCACC-' here. Column 0 now always moves up.
+    scoreMatrix = {(a, b): (2 if a == b else -1) for a in 'AC' for b in 'AC'}
+    assert globalAlignment('CAAAA', 'ACC', scoreMatrix, -1, linearSpace=False) == (-2, 'CAAAA', '-ACC-')
+    assert globalAlignment('CAC', 'ACA', scoreMatrix, -1, linearSpace=False) == (2, 'CAC-', '-ACA')
+    assert globalAlignment('', 'AC', scoreMatrix, -2, linearSpace=False) == (-4, '--', 'AC')
+    assert globalAlignment('AC', '', scoreMatrix, -2, linearSpace=False) == (-4, 'AC', '--')
+
+
+def testAlignmentsAreOptimal():
+    rng = random.Random(0)
+    for _ in range(200):
+        s1 = ''.join(rng.choice('ACG') for _ in range(rng.randint(0, 12)))
+        s2 = ''.join(rng.choice('ACG') for _ in range(rng.randint(0, 12)))
+        for linearSpace in (False, True):
+            maxScore, v, w = globalAlignment(s1, s2, UNIT, -1, linearSpace=linearSpace)
+            assert v.replace('-', '') == s1 and w.replace('-', '') == s2
+            assert alignmentScore(v, w, UNIT, -1) == maxScore
+        assert maxScore == globalAlignment(s1, s2, UNIT, -1, linearSpace=False)[0]
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class ScoringScheme:
+    """
+    Compiled substitution scoring scheme. Scores are stored as a dense small-int array indexed by alphabet code, so
+    alignment code can score whole rows with one array lookup instead of one dict lookup per cell.
+
+    Per-query profiles (profile[c][j] = score of residue code c against query[j]) are cached with LRU eviction, so
+    repeated alignments against the same query skip re-encoding it.
+    """
+
+    def __init__(self, alphabet: str, scores: np.ndarray, profileCacheSize: int = 64):
+        """
+        :param alphabet: characters of the alphabet, in code order
+        :param scores: len(alphabet) x len(alphabet) score array, scores[a][b] = score of aligning a (from the row
+            string) with b (from the column string)
+        :param profileCacheSize: number of query profiles kept in the LRU cache
+        """
+        scores = np.asarray(scores)
+        if scores.shape != (len(alphabet), len(alphabet)):
+            raise ValueError("Score array shape " + str(scores.shape) + " does not match alphabet size "
+                             + str(len(alphabet)))
+        self.alphabet = alphabet
+        self.index = {c: k for k, c in enumerate(alphabet)}
+        self.scores = scores.astype(smallIntType(scores))
+        self.profileCacheSize = profileCacheSize
+        self._profiles = OrderedDict()
+        # Byte -> alphabet code translation table; -1 marks characters outside the alphabet
+        self._codeTable = np.full(256, -1, dtype=np.intp)
+        for c, k in self.index.items():
+            if len(c) == 1 and ord(c) < 256:
+                self._codeTable[ord(c)] = k
+
+    @classmethod
+    def fromDict(cls, scoreMatrix: dict, profileCacheSize: int = 64):
+        """
+        Compiles a dict of character-pair tuples, e.g. Bio.SubsMat.MatrixInfo.blosum62. Pairs that are only stored
+        in one orientation are mirrored; pairs missing in both orientations score 0.
+        """
+        alphabet = ''.join(sorted({c for key in scoreMatrix for c in key}))
+        index = {c: k for k, c in enumerate(alphabet)}
+        scores = np.zeros([len(alphabet), len(alphabet)], dtype=np.int64)
+        for (a, b), score in scoreMatrix.items():
+            scores[index[a]][index[b]] = score
+            if (b, a) not in scoreMatrix:
+                scores[index[b]][index[a]] = score
+        return cls(alphabet, scores, profileCacheSize)
+
+    @classmethod
+    def fromFile(cls, filename: str, profileCacheSize: int = 64):
+        """
+        Loads a BLOSUM62/PAM250-style text matrix. Lines starting with '#' are comments, the first remaining line
+        lists the alphabet and every following line is a residue followed by its scores. Rows may stop at the
+        diagonal (lower-triangular files); missing entries are filled in from the transposed entry.
+        Sample File:
+            #  BLOSUM62 excerpt
+               A  R  N
+            A  4 -1 -2
+            R -1  5  0
+            N -2  0  6
+        """
+        with open(filename) as file:
+            lines = [line.split() for line in file if line.strip() and not line.startswith('#')]
+        alphabet = ''.join(lines[0])
+        index = {c: k for k, c in enumerate(alphabet)}
+        scores = np.zeros([len(alphabet), len(alphabet)], dtype=np.int64)
+        known = np.zeros([len(alphabet), len(alphabet)], dtype=bool)
+        for row in lines[1:]:
+            i = index[row[0]]
+            values = [int(entry) for entry in row[1:]]
+            scores[i, :len(values)] = values
+            known[i, :len(values)] = True
+
+        # symmetrize
+        missing = ~known & known.T
+        scores[missing] = scores.T[missing]
+        return cls(alphabet, scores, profileCacheSize)
+
+    def encode(self, s: str) -> np.ndarray:
+        """ Returns the alphabet codes of s as an intp array. Raises KeyError on characters outside the alphabet. """
+        try:
+            codes = self._codeTable[np.frombuffer(s.encode('latin-1'), dtype=np.uint8)]
+        except UnicodeEncodeError:
+            codes = np.array([self.index[c] for c in s], dtype=np.intp)
+        if len(codes) and codes.min() < 0:
+            raise KeyError(s[int(np.argmin(codes))])
+        return codes
+
+    def profile(self, query: str) -> np.ndarray:
+        """ Returns the len(alphabet) x len(query) profile of query, building and caching it on first use. """
+        profile = self._profiles.get(query)
+        if profile is not None:
+            self._profiles.move_to_end(query)
+            return profile
+
+        profile = self.scores[:, self.encode(query)]
+        self._profiles[query] = profile
+        if len(self._profiles) > self.profileCacheSize:
+            self._profiles.popitem(last=False)
+        return profile
+
+    def score(self, a: str, b: str) -> int:
+        return int(self.scores[self.index[a]][self.index[b]])
+
+
+def smallIntType(scores: np.ndarray) -> np.dtype:
+    """ Returns the smallest signed integer type holding every entry of scores. """
+    if scores.size == 0:
+        return np.dtype(np.int8)
+    return np.result_type(np.min_scalar_type(-abs(int(scores.min())) - 1),
+                          np.min_scalar_type(-abs(int(scores.max())) - 1))
@@ -0,0 +1,134 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from AlignmentKernel import MODES, compileScores, fillRow, findEndCell
+
+# The shared-memory helpers live in the repository root, next to the category folders
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from SharedArrays import shareArrays, releaseArrays, attachArrays, detachArrays
+
+# Shared arrays of the current tiled run, attached once per worker process
+_shared = {}
+
+
+def tiledScore(s1: str, s2: str, scoreMatrix, indelPenalty: int, mode: str, workers: int = None,
+               tileRows: int = 2048, tileCols: int = 2048) -> (int, int, int, int):
+    """ Score-only alignment of one very large pair on several cores. The DP rectangle is split into
+        tileRows x tileCols tiles; all tiles on the same anti-diagonal of tiles are independent and run on a
+        process pool. Tiles exchange their boundary rows and columns through shared memory: one row buffer and one
+        column buffer hold the latest tile edges, and tile corners are kept in a separate small grid, because the
+        corner a tile reads is overwritten by its neighbours in the previous wave.
+        Gives exactly the same result as the serial fillPointers(..., keepPointers=False).
+        Input: Two amino acid strings s1, s2. Scoring matrix (dict or ScoringScheme), indel penalty, alignment mode
+            (see MODES), number of worker processes (default: all cores; 1 runs in this process) and tile size.
+        Return: max score, its row and column, number of cells achieving the max score.
+    """
+    codes1, profile = compileScores(s1, s2, scoreMatrix)
+    initRow, initCol, clamp = MODES[mode]
+    rows = len(codes1) + 1
+    cols = profile.shape[1] + 1
+    tileRowCount = max(1, -(-(rows - 1) // tileRows))
+    tileColCount = max(1, -(-(cols - 1) // tileCols))
+
+    arrays = {
+        'codes1': codes1,
+        'profile': profile,
+        'bottom': np.arange(cols, dtype=np.int64) * indelPenalty if initRow else np.zeros(cols, dtype=np.int64),
+        'right': np.arange(rows, dtype=np.int64) * indelPenalty if initCol else np.zeros(rows, dtype=np.int64),
+        'corners': np.zeros([tileRowCount + 1, tileColCount + 1], dtype=np.int64),
+    }
+    corners = arrays['corners']
+    corners[0] = arrays['bottom'][np.minimum(np.arange(tileColCount + 1) * tileCols, cols - 1)]
+    corners[:, 0] = arrays['right'][np.minimum(np.arange(tileRowCount + 1) * tileRows, rows - 1)]
+
+    blocks, specs = shareArrays(arrays)
+    shared = dict(zip(arrays, blocks))
+    try:
+        settings = (indelPenalty, clamp, tileRows, tileCols)
+
+        workers = workers or os.cpu_count()
+        results = []
+        if workers == 1 or tileRowCount * tileColCount == 1:
+            attachShared(specs, settings)
+            try:
+                for wave in range(tileRowCount + tileColCount - 1):
+                    results += [computeTile(tile) for tile in waveTiles(wave, tileRowCount, tileColCount)]
+            finally:
+                detachShared()
+        else:
+            with ProcessPoolExecutor(workers, initializer=attachShared, initargs=(specs, settings)) as pool:
+                for wave in range(tileRowCount + tileColCount - 1):
+                    results += list(pool.map(computeTile, waveTiles(wave, tileRowCount, tileColCount)))
+
+        bottom = np.ndarray(arrays['bottom'].shape, dtype=np.int64, buffer=shared['bottom'].buf).copy()
+        right = np.ndarray(arrays['right'].shape, dtype=np.int64, buffer=shared['right'].buf).copy()
+        bottom[0] = arrays['right'][rows - 1]
+    finally:
+        releaseArrays(blocks)
+
+    if mode == 'local' and rows > 1 and cols > 1:
+        # First optimal cell in row-major order across tiles, and the total count of optimal cells
+        maxScore = max(result[0] for result in results)
+        best = [result for result in results if result[0] == maxScore]
+        i, j = min((result[1], result[2]) for result in best)
+        return maxScore, i, j, sum(result[3] for result in best)
+    return findEndCell(right, bottom, mode)
+
+
+def waveTiles(wave: int, tileRowCount: int, tileColCount: int) -> list:
+    """ Tiles (tile row, tile column) on anti-diagonal wave of the tile grid. """
+    return [(bi, wave - bi) for bi in range(max(0, wave - tileColCount + 1), min(wave, tileRowCount - 1) + 1)]
+
+
+def attachShared(specs: dict, settings: tuple):
+    """ Pool initializer: maps the shared arrays of the current run into this process. """
+    _shared['settings'] = settings
+    attachArrays(specs, _shared)
+
+
+def detachShared():
+    del _shared['settings']
+    detachArrays(_shared)
+
+
+def computeTile(tile: tuple) -> (int, int, int, int):
+    """ Fills one tile from its top edge, left edge and corner, then publishes its bottom edge, right edge and
+        bottom-right corner.
+        Return: for local alignment, the tile's max score, its first cell in row-major order and its count.
+    """
+    bi, bj = tile
+    indelPenalty, clamp, tileRows, tileCols = _shared['settings']
+    codes1, profile = _shared['codes1'], _shared['profile']
+    bottom, right, corners = _shared['bottom'], _shared['right'], _shared['corners']
+    i0 = bi * tileRows
+    i1 = min(i0 + tileRows, len(codes1))
+    j0 = bj * tileCols
+    j1 = min(j0 + tileCols, profile.shape[1])
+
+    gapRamp = np.arange(j1 - j0 + 1, dtype=np.int64) * indelPenalty
+    prev = np.empty(j1 - j0 + 1, dtype=np.int64)
+    prev[0] = corners[bi][bj]
+    prev[1:] = bottom[j0 + 1:j1 + 1]
+    curr = np.empty_like(prev)
+    subProfile = profile[:, j0:j1]
+    maxScore, maxScoreRow, maxScoreCol, numOptimal = -1, -1, -1, 0
+    for i in range(i0 + 1, i1 + 1):
+        curr[0] = right[i]
+        fillRow(prev, curr, subProfile[codes1[i - 1]], indelPenalty, gapRamp, clamp)
+        body = curr[1:]
+        if clamp and len(body):
+            j = int(np.argmax(body))
+            if body[j] > maxScore:
+                maxScore, maxScoreRow, maxScoreCol = int(body[j]), i, j0 + j + 1
+                numOptimal = 0
+            if body[j] == maxScore:
+                numOptimal += int(np.count_nonzero(body == maxScore))
+        right[i] = curr[-1]
+        prev, curr = curr, prev
+
+    bottom[j0 + 1:j1 + 1] = prev[1:]
+    corners[bi + 1][bj + 1] = prev[-1]
+    return maxScore, maxScoreRow, maxScoreCol, numOptimal
@@ -0,0 +1,47 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def shareArrays(arrays: dict) -> (list, dict):
+    """
+    Copies numpy arrays into new shared memory blocks, for process pools whose initializer calls attachArrays.
+    Returns: blocks = the blocks in the order of arrays, to close and unlink with releaseArrays once the pool is
+        done, specs = name -> (block name, shape, dtype) of every array
+    """
+    blocks = []
+    specs = {}
+    try:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            specs[name] = (block.name, array.shape, array.dtype.str)
+    except BaseException:
+        releaseArrays(blocks)
+        raise
+    return blocks, specs
+
+
+def releaseArrays(blocks: list):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+def attachArrays(specs: dict, target: dict):
+    """ Maps the shared arrays of shareArrays into this process, as entries of target. """
+    target['blocks'] = []
+    for name, (blockName, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=blockName)
+        target['blocks'].append((name, block))
+        target[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def detachArrays(target: dict):
+    """ Drops the arrays attachArrays put into target, then closes their blocks. """
+    blocks = target.pop('blocks')
+    for name, _ in blocks:
+        del target[name]
+    for _, block in blocks:
+        block.close()